@@ -4,20 +4,96 @@ from flask_migrate import Migrate
 from dotenv import load_dotenv
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
+from app import banco
 import os
 
-load_dotenv('.env')
+db = SQLAlchemy(session_options={'class_': banco.SessaoRoteada})
+migrate = Migrate()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+bcrypt = Bcrypt()
 
-app = Flask(__name__)
 
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'chave_fallback')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///musics.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def configurar(app):
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'chave_fallback')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///musics.db')
+    app.config['DATABASE_READ_URL'] = os.getenv('DATABASE_READ_URL')
+    app.config['LEITURA_PRIMARIO_S'] = float(os.getenv('LEITURA_PRIMARIO_S', 5))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_CACHE_KB'] = int(os.getenv('SQLITE_CACHE_KB', 65536))
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+    app.config['DB_POOL_MAX_OVERFLOW'] = int(os.getenv('DB_POOL_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['RECOMENDACOES_POR_PAGINA'] = int(os.getenv('RECOMENDACOES_POR_PAGINA', 20))
+    app.config['RECOMENDACOES_API_LIMITE_MAX'] = int(os.getenv('RECOMENDACOES_API_LIMITE_MAX', 100))
+    app.config['RECOMENDACOES_STREAM_LOTE'] = int(os.getenv('RECOMENDACOES_STREAM_LOTE', 200))
+    app.config['RECOMENDACOES_CACHE_TAMANHO'] = int(os.getenv('RECOMENDACOES_CACHE_TAMANHO', 1024))
+    app.config['RECOMENDACOES_CACHE_TTL'] = int(os.getenv('RECOMENDACOES_CACHE_TTL', 300))
+    app.config['RECOMENDACOES_CANDIDATOS_POR_GENERO'] = int(os.getenv('RECOMENDACOES_CANDIDATOS_POR_GENERO', 500))
+    app.config['ARTISTAS_BUSCA_LIMITE'] = int(os.getenv('ARTISTAS_BUSCA_LIMITE', 10))
+    app.config['ARTISTAS_BUSCA_MAX_AGE'] = int(os.getenv('ARTISTAS_BUSCA_MAX_AGE', 60))
+    app.config['ARTISTAS_SUGERIDOS'] = int(os.getenv('ARTISTAS_SUGERIDOS', 6))
+    app.config['ADMIN_ITENS_POR_PAGINA'] = int(os.getenv('ADMIN_ITENS_POR_PAGINA', 50))
+    app.config['CATALOGO_VERIFICAR_S'] = float(os.getenv('CATALOGO_VERIFICAR_S', 2))
+    app.config['USUARIOS_CACHE_TAMANHO'] = int(os.getenv('USUARIOS_CACHE_TAMANHO', 4096))
+    app.config['USUARIOS_CACHE_TTL'] = int(os.getenv('USUARIOS_CACHE_TTL', 60))
+    app.config['CACHE_VERIFICAR_S'] = float(os.getenv('CACHE_VERIFICAR_S', 2))
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    app.config['SENHA_TRABALHADORES'] = int(os.getenv('SENHA_TRABALHADORES', 2))
+    app.config['SENHA_FILA'] = int(os.getenv('SENHA_FILA', 16))
+    app.config['SENHA_TIMEOUT'] = float(os.getenv('SENHA_TIMEOUT', 5))
+    app.config['METRICAS_ATIVAS'] = os.getenv('METRICAS_ATIVAS', '1') == '1'
+    app.config['METRICAS_LIMIAR_LENTO_MS'] = int(os.getenv('METRICAS_LIMIAR_LENTO_MS', 500))
+    app.config['METRICAS_DIR'] = os.getenv('METRICAS_DIR')
+    app.config['METRICAS_GRAVAR_S'] = float(os.getenv('METRICAS_GRAVAR_S', 5))
+    app.config['ASSETS_MAX_AGE'] = int(os.getenv('ASSETS_MAX_AGE', 31536000))
+    app.config['COMPRESSAO_HTML'] = os.getenv('COMPRESSAO_HTML', '1') == '1'
+    app.config['COMPRESSAO_MINIMO'] = int(os.getenv('COMPRESSAO_MINIMO', 500))
+    app.config['COMPRESSAO_NIVEL'] = int(os.getenv('COMPRESSAO_NIVEL', 6))
+    app.config['SERVIDOR_BIND'] = os.getenv('SERVIDOR_BIND', '0.0.0.0:8000')
+    app.config['SERVIDOR_WORKERS'] = int(os.getenv('SERVIDOR_WORKERS', os.cpu_count() or 1))
+    app.config['SERVIDOR_THREADS'] = int(os.getenv('SERVIDOR_THREADS', 4))
+    app.config['SERVIDOR_TIMEOUT'] = int(os.getenv('SERVIDOR_TIMEOUT', 30))
+    app.config['SERVIDOR_TIMEOUT_GRACIOSO'] = int(os.getenv('SERVIDOR_TIMEOUT_GRACIOSO', 30))
+    app.config['SERVIDOR_MAX_REQUISICOES'] = int(os.getenv('SERVIDOR_MAX_REQUISICOES', 0))
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-bcrypt = Bcrypt(app)
 
-from app import views, models
\ No newline at end of file
+def create_app(config=None):
+    """Monta a aplicação: configuração do ambiente (.env), extensões, rotas e comandos.
+
+    `config` sobrescreve valores lidos do ambiente (útil em benchmarks e testes).
+    """
+    load_dotenv('.env')
+    app = Flask(__name__)
+    configurar(app)
+    if config:
+        app.config.update(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = banco.opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+    app.config['SQLALCHEMY_BINDS'] = banco.binds(app.config)
+
+    db.init_app(app)
+    banco.init_app(app, db)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+    bcrypt.init_app(app)
+
+    from app import models, views, comandos
+    from app.cache import cache_recomendacoes, cache_usuarios, sincronizacao
+    from app.catalogo import catalogo
+    from app.senhas import senhas
+    from app.metricas import metricas
+    from app.assets import assets
+
+    app.register_blueprint(views.bp)
+    comandos.init_app(app)
+    cache_recomendacoes.init_app(app)
+    cache_usuarios.init_app(app)
+    sincronizacao.init_app(app)
+    catalogo.init_app(app)
+    senhas.init_app(app)
+    metricas.init_app(app)
+    assets.init_app(app)
+    return app
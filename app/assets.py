@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # sem o pacote Brotli, só as versões .gz são geradas
+    brotli = None
+
+# Arquivos de texto que valem a pena pré-comprimir no build.
+COMPRIMIVEIS = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+# Codificações servidas pela rota de assets, na ordem de preferência.
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+MANIFESTO = 'manifest.json'
+
+
+def _com_hash(caminho, conteudo):
+    base, extensao = os.path.splitext(caminho)
+    return f"{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{extensao}"
+
+
+def _gravar(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(conteudo)
+
+
+def construir(origem, destino):
+    """Copia os arquivos de `origem` para `destino` com o hash do conteúdo no nome.
+
+    Os de texto ganham também versões .gz (e .br, com o pacote Brotli) quando
+    ficam menores. Versões antigas não são apagadas, para que páginas já
+    servidas durante um deploy continuem achando os seus arquivos.
+    """
+    manifesto = {}
+    destino = os.path.abspath(destino)
+    for raiz, pastas, arquivos in os.walk(origem):
+        pastas[:] = sorted(p for p in pastas if os.path.abspath(os.path.join(raiz, p)) != destino)
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, origem).replace(os.sep, '/')
+            with open(caminho, 'rb') as arquivo:
+                conteudo = arquivo.read()
+            publicado = _com_hash(relativo, conteudo)
+            saida = os.path.join(destino, publicado)
+            _gravar(saida, conteudo)
+            codificacoes = []
+            if relativo.endswith(COMPRIMIVEIS):
+                versoes = {'gzip': gzip.compress(conteudo, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    versoes['br'] = brotli.compress(conteudo, quality=11)
+                for codificacao, extensao in CODIFICACOES:
+                    comprimido = versoes.get(codificacao)
+                    if comprimido is not None and len(comprimido) < len(conteudo):
+                        _gravar(saida + extensao, comprimido)
+                        codificacoes.append(codificacao)
+            manifesto[relativo] = {'arquivo': publicado, 'codificacoes': codificacoes}
+    _gravar(os.path.join(destino, MANIFESTO), json.dumps(manifesto, indent=2, sort_keys=True).encode())
+    return manifesto
+
+
+class Assets:
+    """Assets com hash no nome, pré-comprimidos e servidos com cache imutável.
+
+    `asset_url('css/app.css')` aponta para a versão publicada por
+    `flask assets build`; sem manifesto (ou em modo debug) cai no
+    url_for('static') normal.
+    """
+
+    def __init__(self):
+        self.destino = None
+        self.max_age = 31536000
+        self.manifesto = {}
+        self._publicados = {}
+        self.comprimir_html = True
+        self.minimo_html = 500
+        self.nivel_html = 6
+
+    def init_app(self, app):
+        self.destino = os.path.join(app.static_folder, 'dist')
+        self.max_age = app.config['ASSETS_MAX_AGE']
+        self.comprimir_html = app.config['COMPRESSAO_HTML']
+        self.minimo_html = app.config['COMPRESSAO_MINIMO']
+        self.nivel_html = app.config['COMPRESSAO_NIVEL']
+        if not app.debug:
+            self.carregar()
+        app.add_url_rule('/assets/<path:nome>', 'asset', self.servir)
+        app.add_template_global(self.asset_url, 'asset_url')
+        if self.comprimir_html:
+            app.after_request(self._comprimir_html)
+
+    def carregar(self):
+        caminho = os.path.join(self.destino, MANIFESTO)
+        if not os.path.exists(caminho):
+            self.manifesto, self._publicados = {}, {}
+            return
+        with open(caminho) as arquivo:
+            self.manifesto = json.load(arquivo)
+        self._publicados = {e['arquivo']: e['codificacoes'] for e in self.manifesto.values()}
+
+    def asset_url(self, filename, **valores):
+        entrada = self.manifesto.get(filename)
+        if entrada is None:
+            return url_for('static', filename=filename, **valores)
+        return url_for('asset', nome=entrada['arquivo'], **valores)
+
+    def servir(self, nome):
+        codificacoes = self._publicados.get(nome)
+        if codificacoes is None:
+            abort(404)
+        tipo = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+        aceitas = request.accept_encodings
+        for codificacao, extensao in CODIFICACOES:
+            if codificacao in codificacoes and aceitas[codificacao]:
+                resposta = send_from_directory(self.destino, nome + extensao, mimetype=tipo)
+                resposta.headers['Content-Encoding'] = codificacao
+                break
+        else:
+            resposta = send_from_directory(self.destino, nome, mimetype=tipo)
+        if codificacoes:
+            resposta.vary.add('Accept-Encoding')
+        resposta.headers['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        return resposta
+
+    def _comprimir_html(self, resposta):
+        if (
+            resposta.mimetype != 'text/html'
+            or resposta.direct_passthrough
+            or resposta.is_streamed
+            or resposta.status_code in (204, 304)
+            or 'Content-Encoding' in resposta.headers
+            or not request.accept_encodings['gzip']
+        ):
+            return resposta
+        dados = resposta.get_data()
+        if len(dados) < self.minimo_html:
+            return resposta
+        resposta.set_data(gzip.compress(dados, compresslevel=self.nivel_html))
+        resposta.headers['Content-Encoding'] = 'gzip'
+        resposta.vary.add('Accept-Encoding')
+        return resposta
+
+
+assets = Assets()
@@ -0,0 +1,74 @@
+import bisect
+import hashlib
+import threading
+
+from app.catalogo import catalogo
+from app.texto import normalizar
+
+# Maior caractere possível: fecha o intervalo de prefixo no bisect.
+_FIM = "\U0010ffff"
+
+
+class IndiceArtistas:
+    """Índice de prefixos em memória sobre os nomes de artistas.
+
+    Guarda duas listas ordenadas: os nomes completos normalizados e cada
+    palavra de cada nome. Uma busca é um par de bisects, sem tocar no banco.
+    O índice é reconstruído a partir do snapshot do catálogo sempre que
+    ele troca de versão.
+    """
+
+    def __init__(self):
+        self.versao = ""
+        self._origem = None
+        self._lock = threading.Lock()
+        self._dados = ([], [], [])
+
+    def atualizar(self):
+        self.construir(catalogo.atual())
+
+    def construir(self, snapshot):
+        if snapshot is self._origem:
+            return
+        with self._lock:
+            if snapshot is self._origem:
+                return
+            artistas = sorted((normalizar(nome), nome, id) for id, nome in snapshot.artistas)
+            palavras = sorted(
+                (palavra, posicao)
+                for posicao, (chave, _, _) in enumerate(artistas)
+                for palavra in set(chave.split()[1:])
+            )
+            self._dados = (artistas, [chave for chave, _, _ in artistas], palavras)
+            # Derivada do conteúdo, para que workers com o mesmo catálogo gerem o mesmo ETag.
+            self.versao = hashlib.sha1(repr(artistas).encode()).hexdigest()[:12]
+            self._origem = snapshot
+
+    def buscar(self, termo, limite):
+        """Retorna até `limite` pares (id, nome): exato, prefixo do nome, prefixo de palavra."""
+        self.atualizar()
+        artistas, nomes, palavras = self._dados
+        prefixo = normalizar(termo)
+
+        inicio = bisect.bisect_left(nomes, prefixo)
+        fim = bisect.bisect_right(nomes, prefixo + _FIM, inicio)
+        posicoes = list(range(inicio, min(fim, inicio + limite)))
+
+        if prefixo and len(posicoes) < limite:
+            vistas = set(posicoes)
+            i = bisect.bisect_left(palavras, (prefixo,))
+            while i < len(palavras) and len(posicoes) < limite:
+                palavra, posicao = palavras[i]
+                if not palavra.startswith(prefixo):
+                    break
+                if posicao not in vistas:
+                    vistas.add(posicao)
+                    posicoes.append(posicao)
+                i += 1
+
+        return [(artistas[p][2], artistas[p][1]) for p in posicoes]
+
+
+indice_artistas = IndiceArtistas()
+# Reconstruído na thread que carrega o snapshot, antes de ele entrar em uso.
+catalogo.ao_carregar(indice_artistas.construir)
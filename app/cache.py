@@ -0,0 +1,275 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from flask import has_app_context
+from sqlalchemy import func, select, update
+
+from app import db
+from app.banco import ultima_escrita
+from app.catalogo import catalogo
+from app.eventos import Alteracoes, antes_de_confirmar, ao_confirmar
+from app.importacao import insert_ignorando
+from app.models import CatalogoVersao, ItemAlterado
+
+
+class CacheRecomendacoes:
+    """Cache LRU com TTL das páginas de recomendação, indexado por usuário.
+
+    Cada entrada guarda os gêneros e artistas dos quais depende (os escolhidos
+    pelo usuário e os das músicas da página), para que uma alteração no
+    catálogo derrube só as entradas que ela realmente afeta, feita neste
+    processo ou, pela Sincronizacao, em outro. Enquanto o snapshot em uso for
+    anterior à última versão do catálogo conhecida, nada é guardado: o valor
+    montado com ele já nasceria velho.
+    """
+
+    def __init__(self, tamanho=1024, ttl=300):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._por_usuario = defaultdict(set)
+        self._catalogo_minimo = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.tamanho = app.config['RECOMENDACOES_CACHE_TAMANHO']
+        self.ttl = app.config['RECOMENDACOES_CACHE_TTL']
+
+    def obter(self, chave):
+        sincronizacao.verificar()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    self._remover(chave)
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return entrada[1]
+
+    def guardar(self, chave, valor, generos, artistas, versao=None, similares=False):
+        """Guarda `valor`, que depende dos `generos` e `artistas` dados.
+
+        `versao` é a do snapshot do catálogo usado para montá-lo; `similares`
+        diz que ele vem dos artistas similares calculados.
+        """
+        if self.tamanho <= 0:
+            return
+        with self._lock:
+            if versao is not None and versao < self._catalogo_minimo:
+                return
+            self._remover(chave)
+            expira = time.monotonic() + self.ttl
+            self._entradas[chave] = (expira, valor, frozenset(generos), frozenset(artistas), similares)
+            self._por_usuario[chave[0]].add(chave)
+            while len(self._entradas) > self.tamanho:
+                self._remover(next(iter(self._entradas)))
+
+    def invalidar(self, alteracoes):
+        with self._lock:
+            if alteracoes.versao_catalogo is not None:
+                self._catalogo_minimo = max(self._catalogo_minimo, alteracoes.versao_catalogo)
+            if alteracoes.tudo:
+                self._entradas.clear()
+                self._por_usuario.clear()
+                return
+            for usuario_id in alteracoes.usuarios:
+                for chave in list(self._por_usuario.get(usuario_id, ())):
+                    self._remover(chave)
+            if alteracoes.generos or alteracoes.artistas or alteracoes.similares:
+                afetadas = [
+                    chave for chave, (_, _, generos, artistas, similares) in self._entradas.items()
+                    if (similares and alteracoes.similares)
+                    or not generos.isdisjoint(alteracoes.generos)
+                    or not artistas.isdisjoint(alteracoes.artistas)
+                ]
+                for chave in afetadas:
+                    self._remover(chave)
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+            }
+
+    def _remover(self, chave):
+        if self._entradas.pop(chave, None) is None:
+            return
+        chaves = self._por_usuario.get(chave[0])
+        if chaves is not None:
+            chaves.discard(chave)
+            if not chaves:
+                del self._por_usuario[chave[0]]
+
+
+class CacheUsuarios:
+    """Cache curto das colunas de User usadas por load_user, por id.
+
+    Guarda só valores simples (nunca a instância ORM): a cada requisição o
+    usuário é remontado e anexado à sessão sem SELECT.
+    """
+
+    CAMPOS = ("id", "nome", "email", "is_admin")
+
+    def __init__(self, tamanho=4096, ttl=60):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.tamanho = app.config['USUARIOS_CACHE_TAMANHO']
+        self.ttl = app.config['USUARIOS_CACHE_TTL']
+
+    def obter(self, usuario_id):
+        sincronizacao.verificar()
+        with self._lock:
+            entrada = self._entradas.get(usuario_id)
+            if entrada is None or entrada[0] < time.monotonic():
+                self._entradas.pop(usuario_id, None)
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(usuario_id)
+            self.acertos += 1
+            return entrada[1]
+
+    def guardar(self, usuario):
+        if self.tamanho <= 0:
+            return
+        dados = {campo: getattr(usuario, campo) for campo in self.CAMPOS}
+        with self._lock:
+            self._entradas.pop(usuario.id, None)
+            self._entradas[usuario.id] = (time.monotonic() + self.ttl, dados)
+            while len(self._entradas) > self.tamanho:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, alteracoes):
+        with self._lock:
+            if alteracoes.tudo:
+                self._entradas.clear()
+                return
+            for usuario_id in alteracoes.contas:
+                self._entradas.pop(usuario_id, None)
+
+
+class Sincronizacao:
+    """Leva aos caches deste processo as alterações confirmadas por outros processos.
+
+    Todo commit que toca usuários, gêneros ou artistas grava em item_alterado
+    o instante da alteração de cada um. No máximo a cada CACHE_VERIFICAR_S
+    segundos, ou logo que chega uma requisição de um navegador que gravou algo
+    em outro processo depois da última conferência, o worker lê as linhas
+    alteradas desde a última vista (pelo índice de alterado_em) e invalida só
+    esses itens nos dois caches. O instante é tomado antes do commit, então a
+    leitura recua `margem` µs para não perder transações lentas; as linhas já
+    aplicadas não são aplicadas de novo.
+    """
+
+    margem = 10_000_000
+
+    def __init__(self):
+        self.intervalo = 2.0
+        self._vista = None
+        self._aplicadas = {}
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.intervalo = app.config['CACHE_VERIFICAR_S']
+
+    def _vencida(self):
+        return (time.time() >= self._verificado_em + self.intervalo
+                or ultima_escrita(de_outro_processo=True) > self._verificado_em)
+
+    def verificar(self):
+        if not has_app_context() or not self._vencida():
+            return
+        with self._lock:
+            if not self._vencida():
+                return
+            self._verificado_em = time.time()
+            if self._vista is None:
+                # Os caches começam vazios: basta saber de onde continuar.
+                self._vista = db.session.scalar(select(func.max(ItemAlterado.alterado_em))) or 0
+                return
+            linhas = db.session.execute(
+                select(ItemAlterado.tipo, ItemAlterado.item_id, ItemAlterado.alterado_em)
+                .where(ItemAlterado.alterado_em > self._vista - self.margem)
+            ).all()
+            novas = [(tipo, id) for tipo, id, em in linhas if self._aplicadas.get((tipo, id)) != em]
+            if linhas:
+                self._vista = max(self._vista, max(em for _, _, em in linhas))
+            self._aplicadas = {
+                **{item: em for item, em in self._aplicadas.items() if em > self._vista - self.margem},
+                **{(tipo, id): em for tipo, id, em in linhas},
+            }
+            if novas:
+                self._aplicar(novas)
+
+    def _aplicar(self, itens):
+        alteracoes = Alteracoes()
+        for tipo, id in itens:
+            if tipo == "usuario":
+                alteracoes.usuarios.add(id)
+                alteracoes.contas.add(id)
+            elif tipo == "genero":
+                alteracoes.generos.add(id)
+            elif tipo == "artista":
+                alteracoes.artistas.add(id)
+            elif tipo == "similares":
+                alteracoes.similares = True
+            elif tipo == "tudo":
+                alteracoes.tudo = True
+        if alteracoes.tudo or alteracoes.generos or alteracoes.artistas:
+            alteracoes.versao_catalogo = db.session.scalar(
+                select(CatalogoVersao.versao).where(CatalogoVersao.id == 1))
+            catalogo.marcar_sujo()
+        cache_recomendacoes.invalidar(alteracoes)
+        cache_usuarios.invalidar(alteracoes)
+
+
+cache_recomendacoes = CacheRecomendacoes()
+cache_usuarios = CacheUsuarios()
+sincronizacao = Sincronizacao()
+
+
+@ao_confirmar
+def _invalidar_caches(alteracoes):
+    cache_recomendacoes.invalidar(alteracoes)
+    cache_usuarios.invalidar(alteracoes)
+
+
+@antes_de_confirmar
+def _registrar_alteracoes(sessao, alteracoes):
+    itens = {
+        "usuario": alteracoes.usuarios | alteracoes.contas,
+        "genero": alteracoes.generos,
+        "artista": alteracoes.artistas,
+        "similares": {0} if alteracoes.similares else (),
+        "tudo": {0} if alteracoes.tudo else (),
+    }
+    agora = time.time_ns() // 1000
+    for tipo, ids in itens.items():
+        if not ids:
+            continue
+        # Uma linha por item, atualizada no lugar: salvar as preferências custa um UPDATE.
+        resultado = sessao.execute(
+            update(ItemAlterado)
+            .where(ItemAlterado.tipo == tipo, ItemAlterado.item_id.in_(ids))
+            .values(alterado_em=agora)
+        )
+        if resultado.rowcount < len(ids):
+            sessao.execute(
+                insert_ignorando(ItemAlterado.__table__),
+                [{"tipo": tipo, "item_id": id, "alterado_em": agora} for id in ids],
+            )
@@ -0,0 +1,264 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from array import array
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import insert, select, update
+
+from app import db
+from app.banco import ultima_escrita
+from app.eventos import antes_de_confirmar, ao_confirmar
+from app.models import Artista, CatalogoVersao, Genero, Musica, musica_genero
+
+logger = logging.getLogger(__name__)
+
+ItemCatalogo = namedtuple("ItemCatalogo", "id nome")
+
+
+class MapaNomes:
+    """id -> nome sobre um array ordenado de ids e uma tupla de nomes alinhada."""
+
+    def __init__(self, linhas):
+        self.ids = array("q")
+        nomes = []
+        for id, nome in linhas:
+            self.ids.append(id)
+            nomes.append(nome)
+        self.nomes = tuple(nomes)
+
+    def _posicao(self, id):
+        posicao = bisect.bisect_left(self.ids, id)
+        if posicao < len(self.ids) and self.ids[posicao] == id:
+            return posicao
+        return None
+
+    def get(self, id, padrao=None):
+        posicao = self._posicao(id)
+        return padrao if posicao is None else self.nomes[posicao]
+
+    def __getitem__(self, id):
+        posicao = self._posicao(id)
+        if posicao is None:
+            raise KeyError(id)
+        return self.nomes[posicao]
+
+    def __contains__(self, id):
+        return self._posicao(id) is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return map(ItemCatalogo, self.ids, self.nomes)
+
+    def pagina(self, filtro, apos, limite):
+        """Página por id (keyset) dos itens cujo nome contém `filtro`, sem diferenciar caixa."""
+        filtro = filtro.casefold()
+        itens = []
+        inicio = bisect.bisect_right(self.ids, apos) if apos else 0
+        for posicao in range(inicio, len(self.ids)):
+            if filtro in self.nomes[posicao].casefold():
+                itens.append(ItemCatalogo(self.ids[posicao], self.nomes[posicao]))
+                if len(itens) > limite:
+                    return itens[:limite], itens[limite - 1].id
+        return itens, None
+
+
+class Adjacencia:
+    """Listas de adjacência no formato CSR: chaves, início de cada lista e valores."""
+
+    def __init__(self, pares):
+        # `pares` precisa vir ordenado pela chave.
+        self.chaves = array("q")
+        self.inicios = array("q")
+        self.valores = array("q")
+        anterior = None
+        for chave, valor in pares:
+            if chave != anterior:
+                self.chaves.append(chave)
+                self.inicios.append(len(self.valores))
+                anterior = chave
+            self.valores.append(valor)
+        self.inicios.append(len(self.valores))
+
+    def get(self, chave):
+        posicao = bisect.bisect_left(self.chaves, chave)
+        if posicao == len(self.chaves) or self.chaves[posicao] != chave:
+            return array("q")
+        return self.valores[self.inicios[posicao]:self.inicios[posicao + 1]]
+
+    def itens(self):
+        """Gera (chave, valores) para cada chave, em ordem."""
+        for posicao, chave in enumerate(self.chaves):
+            yield chave, self.valores[self.inicios[posicao]:self.inicios[posicao + 1]]
+
+
+def _melhores_por_genero(generos_por_musica, maximo):
+    # As músicas com mais gêneros vêm primeiro: são as que podem somar mais pontos
+    # para quem escolheu vários deles. Empates ficam pelo id, como nas recomendações.
+    por_genero = defaultdict(list)
+    for musica_id, generos in generos_por_musica.itens():
+        for genero_id in generos:
+            por_genero[genero_id].append((-len(generos), musica_id))
+    return Adjacencia(
+        (genero_id, musica_id)
+        for genero_id in sorted(por_genero)
+        for _, musica_id in heapq.nsmallest(maximo, por_genero[genero_id])
+    )
+
+
+class Snapshot:
+    """Fotografia imutável do catálogo de referência (gêneros, artistas e ligações).
+
+    `generos_por_musica` dá os gêneros exibidos e pontuados de cada música;
+    `musicas_por_artista` e `musicas_por_genero` são as candidatas das
+    recomendações. Esta última guarda só as `maximo` melhores de cada gênero,
+    para que o custo de recomendar não cresça com o catálogo.
+    """
+
+    def __init__(self, versao, generos, artistas, musicas_por_artista, musicas_por_genero,
+                 generos_por_musica):
+        self.versao = versao
+        self.generos = generos
+        self.artistas = artistas
+        self.musicas_por_artista = musicas_por_artista
+        self.musicas_por_genero = musicas_por_genero
+        self.generos_por_musica = generos_por_musica
+        self.lista_generos = tuple(generos)
+        self.generos_por_nome = tuple(sorted(self.lista_generos, key=lambda g: g.nome))
+
+    @classmethod
+    def carregar(cls, versao, maximo=500):
+        # Direto na conexão, sem o carregamento do ORM: são centenas de milhares de pares.
+        conexao = db.session.connection()
+        generos_por_musica = Adjacencia(conexao.execute(
+            select(musica_genero.c.musica_id, musica_genero.c.genero_id)
+            .order_by(musica_genero.c.musica_id, musica_genero.c.genero_id)))
+        return cls(
+            versao=versao,
+            generos=MapaNomes(conexao.execute(select(Genero.id, Genero.nome).order_by(Genero.id))),
+            artistas=MapaNomes(conexao.execute(select(Artista.id, Artista.nome).order_by(Artista.id))),
+            musicas_por_artista=Adjacencia(conexao.execute(
+                select(Musica.artista_id, Musica.id).order_by(Musica.artista_id, Musica.id))),
+            musicas_por_genero=_melhores_por_genero(generos_por_musica, maximo),
+            generos_por_musica=generos_por_musica,
+        )
+
+    def generos_da_musica(self, musica_id):
+        return [ItemCatalogo(id, self.generos[id]) for id in self.generos_por_musica.get(musica_id)]
+
+
+class Catalogo:
+    """Snapshot do catálogo por worker, recarregado inteiro quando a versão muda.
+
+    Todo commit que altera gêneros, artistas ou músicas incrementa a versão
+    em catalogo_versao dentro da própria transação. Cada worker confere essa
+    versão no máximo a cada CATALOGO_VERIFICAR_S segundos (uma consulta pela
+    chave primária) e, se mudou, monta um Snapshot novo numa thread à parte:
+    as requisições continuam lendo o anterior, que é coerente, até a troca
+    da referência. Só a primeira carga bloqueia, porque não há o que servir.
+    Commits feitos no próprio worker disparam a recarga na próxima leitura;
+    os de outro worker, na próxima requisição do navegador que os fez.
+    """
+
+    def __init__(self):
+        self.intervalo = 2.0
+        self.candidatos_por_genero = 500
+        self._app = None
+        self._snapshot = None
+        self._sujo = True
+        self._proxima_verificacao = 0.0
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+        self._carga = None
+        self._preparar = []
+
+    def init_app(self, app):
+        self.intervalo = app.config['CATALOGO_VERIFICAR_S']
+        self.candidatos_por_genero = app.config['RECOMENDACOES_CANDIDATOS_POR_GENERO']
+        self._app = app
+
+    def ao_carregar(self, func):
+        """Registra `func(snapshot)`, chamada na thread da carga antes do snapshot entrar em uso."""
+        self._preparar.append(func)
+        return func
+
+    def marcar_sujo(self):
+        self._sujo = True
+
+    def atual(self, esperar=False):
+        """O snapshot em uso; com `esperar`, aguarda uma recarga já disparada terminar.
+
+        `esperar` é para telas que precisam mostrar uma alteração recém-feita
+        (o painel de administração), não para o caminho das requisições comuns.
+        """
+        if self._vencido():
+            self._verificar()
+        carga = self._carga
+        if esperar and carga is not None:
+            carga.join()
+        return self._snapshot
+
+    def _vencido(self):
+        return (self._sujo or time.monotonic() >= self._proxima_verificacao
+                or ultima_escrita() > self._verificado_em)
+
+    def _verificar(self):
+        with self._lock:
+            if not self._vencido():
+                return
+            if self._carga is not None:
+                # Marcas feitas durante a carga em andamento ficam para a próxima verificação.
+                return
+            # A versão é lida antes dos dados: uma alteração no meio da carga só força outra recarga.
+            versao = db.session.scalar(select(CatalogoVersao.versao).where(CatalogoVersao.id == 1))
+            self._proxima_verificacao = time.monotonic() + self.intervalo
+            self._verificado_em = time.time()
+            if not (self._sujo or self._snapshot is None or self._snapshot.versao != versao):
+                return
+            self._sujo = False
+            if self._snapshot is None:
+                self._snapshot = self._carregar(versao)
+                return
+            self._carga = threading.Thread(target=self._recarregar, args=(versao,), name="catalogo", daemon=True)
+            self._carga.start()
+
+    def _carregar(self, versao):
+        snapshot = Snapshot.carregar(versao, self.candidatos_por_genero)
+        for func in self._preparar:
+            func(snapshot)
+        return snapshot
+
+    def _recarregar(self, versao):
+        try:
+            with self._app.app_context():
+                self._snapshot = self._carregar(versao)
+        except Exception:
+            # O snapshot anterior continua em uso; a próxima verificação tenta de novo.
+            logger.exception("Falha ao recarregar o catálogo (versão %s)", versao)
+        finally:
+            self._carga = None
+
+
+catalogo = Catalogo()
+
+
+@antes_de_confirmar
+def _nova_versao(sessao, alteracoes):
+    if not (alteracoes.tudo or alteracoes.generos or alteracoes.artistas):
+        return
+    resultado = sessao.execute(
+        update(CatalogoVersao).where(CatalogoVersao.id == 1).values(versao=CatalogoVersao.versao + 1)
+    )
+    if resultado.rowcount == 0:
+        sessao.execute(insert(CatalogoVersao).values(id=1, versao=1))
+    alteracoes.versao_catalogo = sessao.scalar(select(CatalogoVersao.versao).where(CatalogoVersao.id == 1))
+
+
+@ao_confirmar
+def _recarregar(alteracoes):
+    if alteracoes.tudo or alteracoes.generos or alteracoes.artistas:
+        catalogo.marcar_sujo()
@@ -0,0 +1,90 @@
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, pass_script_info
+
+from app.assets import assets, construir
+from app.importacao import ImportadorCatalogo, ler_arquivo
+from app.metricas import memoria_processo
+from app.servidor import aquecer, idade_processo, mb, servir
+from app.similares import CalculoSimilares
+
+catalog = AppGroup("catalog", help="Manutenção do catálogo de músicas.")
+assets_cli = AppGroup("assets", help="Arquivos estáticos publicados.")
+
+
+@catalog.command("import")
+@click.argument("arquivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--formato", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Formato do arquivo. Padrão: deduzido pela extensão.")
+@click.option("--lote", default=5000, show_default=True, help="Linhas por lote/commit.")
+def importar_catalogo(arquivo, formato, lote):
+    """Importa músicas (titulo, artista, generos) de um CSV ou JSONL."""
+    inicio = time.perf_counter()
+
+    def progresso(importador):
+        decorrido = time.perf_counter() - inicio
+        click.echo(
+            f"{importador.lidas} linhas lidas, {importador.novas} músicas novas "
+            f"({importador.lidas / decorrido:.0f} linhas/s)"
+        )
+
+    importador = ImportadorCatalogo(tamanho_lote=lote)
+    importador.importar(ler_arquivo(arquivo, formato), progresso=progresso)
+    click.echo(
+        f"Concluído em {time.perf_counter() - inicio:.1f}s: {importador.novas} músicas novas, "
+        f"{importador.ignoradas} linhas ignoradas, {len(importador.artistas)} artistas, "
+        f"{len(importador.generos)} gêneros."
+    )
+
+
+
+@catalog.command("similar")
+@click.option("--completo", is_flag=True, help="Recalcula todos os artistas, não só os pendentes.")
+@click.option("--vizinhos", default=20, show_default=True, help="Artistas similares guardados por artista.")
+@click.option("--bloco", default=2000, show_default=True, help="Artistas por bloco de Aᵀ A (limita a memória).")
+def calcular_similares(completo, vizinhos, bloco):
+    """Calcula os artistas similares a partir das preferências dos usuários (requer numpy e scipy)."""
+    inicio = time.perf_counter()
+    calculo = CalculoSimilares(vizinhos=vizinhos, bloco=bloco)
+    calculo.executar(completo=completo)
+    click.echo(
+        f"Concluído em {time.perf_counter() - inicio:.1f}s: {calculo.calculados} artistas recalculados, "
+        f"{calculo.gravados} pares gravados."
+    )
+
+
+@assets_cli.command("build")
+def construir_assets():
+    """Gera as versões com hash e pré-comprimidas de app/static em app/static/dist."""
+    manifesto = construir(current_app.static_folder, assets.destino)
+    assets.carregar()
+    comprimidos = sum(1 for entrada in manifesto.values() if entrada["codificacoes"])
+    click.echo(f"{len(manifesto)} arquivos publicados em {assets.destino} ({comprimidos} pré-comprimidos).")
+
+
+@click.command("serve")
+@click.option("--workers", type=int, help="Processos (padrão: SERVIDOR_WORKERS).")
+@click.option("--threads", type=int, help="Threads por processo (padrão: SERVIDOR_THREADS).")
+@click.option("--bind", help="Endereço host:porta (padrão: SERVIDOR_BIND).")
+@pass_script_info
+def servir_producao(info, workers, threads, bind):
+    """Servidor de produção: aquece o catálogo e faz o fork dos workers do gunicorn."""
+    app = info.load_app()
+    segundos = aquecer(app)
+    idade = idade_processo()
+    rss, pss = memoria_processo()
+    click.echo(
+        f"Aquecido em {segundos:.2f}s; pronto para o fork "
+        f"{'?' if idade is None else f'{idade:.2f}'}s após o início do processo "
+        f"(RSS {mb(rss)}, PSS {mb(pss)}).",
+        err=True,
+    )
+    servir(app, workers=workers, threads=threads, bind=bind)
+
+
+def init_app(app):
+    app.cli.add_command(catalog)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(servir_producao)
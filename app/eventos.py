@@ -0,0 +1,123 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Artista, Genero, Musica, User, UserArtista, UserGenero
+
+# Alterações acumuladas em session.info até o commit (ou descartadas no rollback).
+_CHAVE = "alteracoes"
+
+_ouvintes = []
+_antes_do_commit = []
+
+
+class Alteracoes:
+    """Ids tocados por uma transação, agrupados pelo que eles afetam."""
+
+    def __init__(self):
+        self.usuarios = set()
+        self.contas = set()
+        self.generos = set()
+        self.artistas = set()
+        self.tudo = False
+        self.similares = False
+        # Versão do catálogo gravada pela transação, quando ela o alterou.
+        self.versao_catalogo = None
+
+    def __bool__(self):
+        return bool(self.tudo or self.similares or self.usuarios or self.contas or self.generos
+                    or self.artistas)
+
+
+def ao_confirmar(func):
+    """Registra `func(alteracoes)` para ser chamada depois de cada commit com mudanças."""
+    _ouvintes.append(func)
+    return func
+
+
+def antes_de_confirmar(func):
+    """Registra `func(sessao, alteracoes)`, chamada dentro da transação logo antes do commit."""
+    _antes_do_commit.append(func)
+    return func
+
+
+def _pendentes(sessao):
+    return sessao.info.setdefault(_CHAVE, Alteracoes())
+
+
+def marcar(usuarios=(), contas=(), generos=(), artistas=(), tudo=False, similares=False, sessao=None):
+    """Registra alterações feitas por fora do ORM (delete/insert em lote)."""
+    alt = _pendentes(sessao if sessao is not None else db.session)
+    alt.usuarios.update(usuarios)
+    alt.contas.update(contas)
+    alt.generos.update(generos)
+    alt.artistas.update(artistas)
+    alt.tudo = alt.tudo or tudo
+    alt.similares = alt.similares or similares
+
+
+def _valores(obj, atributo):
+    historico = inspect(obj).attrs[atributo].history
+    return {getattr(obj, atributo), *historico.deleted}
+
+
+def _generos_da_musica(obj):
+    removidos = inspect(obj).attrs.generos.history.deleted
+    return {g.id for g in (*obj.generos, *removidos)}
+
+
+def _coletar(alt, obj):
+    if isinstance(obj, (UserGenero, UserArtista)):
+        alt.usuarios.update(_valores(obj, "usuario_id"))
+    elif isinstance(obj, User):
+        alt.usuarios.add(obj.id)
+        alt.contas.add(obj.id)
+    elif isinstance(obj, Genero):
+        alt.generos.add(obj.id)
+    elif isinstance(obj, Artista):
+        alt.artistas.add(obj.id)
+    elif isinstance(obj, Musica):
+        alt.artistas.update(_valores(obj, "artista_id"))
+        alt.generos.update(_generos_da_musica(obj))
+
+
+@event.listens_for(Session, "before_flush")
+def _antes_do_flush(sessao, contexto, instancias):
+    # Alterados e removidos são lidos antes do flush, enquanto o estado antigo existe.
+    alt = _pendentes(sessao)
+    for obj in (*sessao.dirty, *sessao.deleted):
+        _coletar(alt, obj)
+
+
+@event.listens_for(Session, "after_flush")
+def _depois_do_flush(sessao, contexto):
+    # Novos só têm id depois do flush.
+    alt = _pendentes(sessao)
+    for obj in sessao.new:
+        _coletar(alt, obj)
+
+
+@event.listens_for(Session, "before_commit")
+def _antes_de_confirmar(sessao):
+    if not _antes_do_commit:
+        return
+    # O flush roda aqui para que os objetos novos já estejam nas alterações.
+    sessao.flush()
+    alt = sessao.info.get(_CHAVE)
+    if alt:
+        for func in _antes_do_commit:
+            func(sessao, alt)
+
+
+@event.listens_for(Session, "after_commit")
+def _depois_do_commit(sessao):
+    alt = sessao.info.pop(_CHAVE, None)
+    if not alt:
+        return
+    for ouvinte in _ouvintes:
+        ouvinte(alt)
+
+
+@event.listens_for(Session, "after_rollback")
+def _depois_do_rollback(sessao):
+    sessao.info.pop(_CHAVE, None)
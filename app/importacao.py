@@ -0,0 +1,180 @@
+import csv
+import json
+import re
+
+from sqlalchemy import insert, select, tuple_
+
+from app import db
+from app.eventos import marcar
+from app.models import Artista, Genero, Musica, musica_genero
+from app.texto import normalizar
+
+# Cabeçalhos aceitos no CSV/JSONL, em português ou inglês.
+_CAMPOS = {
+    "titulo": ("titulo", "title"),
+    "artista": ("artista", "artist"),
+    "generos": ("generos", "genres"),
+}
+_SEPARADOR_GENEROS = re.compile(r"[;|]")
+
+
+def _campo(registro, nome):
+    for chave in _CAMPOS[nome]:
+        if registro.get(chave) is not None:
+            return registro[chave]
+    return None
+
+
+def _normalizar(registro):
+    titulo = (_campo(registro, "titulo") or "").strip()
+    artista = (_campo(registro, "artista") or "").strip()
+    generos = _campo(registro, "generos") or []
+    if isinstance(generos, str):
+        generos = _SEPARADOR_GENEROS.split(generos)
+    generos = [g.strip() for g in generos if g and g.strip()]
+    if not titulo or not artista:
+        return None
+    return titulo, artista, generos
+
+
+def _ler_json(linha):
+    try:
+        registro = json.loads(linha)
+    except ValueError:
+        return None
+    return registro if isinstance(registro, dict) else None
+
+
+def ler_arquivo(caminho, formato=None):
+    """Gera (titulo, artista, generos) linha a linha, sem carregar o arquivo na memória.
+
+    Linhas inválidas (incompletas ou, no JSONL, que não são um objeto JSON) viram None.
+    """
+    formato = formato or ("jsonl" if caminho.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+        if formato == "csv":
+            registros = csv.DictReader(arquivo)
+        else:
+            registros = (_ler_json(linha) for linha in arquivo if linha.strip())
+        for registro in registros:
+            yield None if registro is None else _normalizar(registro)
+
+
+def insert_ignorando(tabela):
+    # Linhas que já existem (chave única/primária) são puladas: rodar de novo não duplica.
+    return insert(tabela).prefix_with("OR IGNORE", dialect="sqlite").prefix_with("IGNORE", dialect="mysql")
+
+
+class ImportadorCatalogo:
+    """Carrega músicas em lotes com executemany, resolvendo artistas e gêneros em memória.
+
+    Só os mapas nome -> id de artistas e gêneros crescem com o catálogo; as
+    músicas passam em lotes de `tamanho_lote` e são descartadas após o commit.
+    """
+
+    def __init__(self, tamanho_lote=5000):
+        self.tamanho_lote = tamanho_lote
+        self.lidas = 0
+        self.ignoradas = 0
+        self.novas = 0
+        self.lotes = 0
+        self.alterado = False
+        # Artistas são casados pela mesma chave de app.texto.normalizar gravada em nome_normalizado;
+        # entre nomes com a mesma chave, fica o de menor id (a ordem decrescente faz ele ser o último).
+        self.artistas = dict(db.session.execute(
+            select(Artista.nome_normalizado, Artista.id)
+            .where(Artista.nome_normalizado.is_not(None))
+            .order_by(Artista.id.desc())
+        ).all())
+        self.generos = {nome.lower(): id for id, nome in db.session.execute(select(Genero.id, Genero.nome))}
+
+    def importar(self, linhas, progresso=None):
+        lote = []
+        try:
+            for linha in linhas:
+                self.lidas += 1
+                if linha is None:
+                    self.ignoradas += 1
+                    continue
+                lote.append(linha)
+                if len(lote) >= self.tamanho_lote:
+                    self._gravar(lote)
+                    lote = []
+                    if progresso:
+                        progresso(self)
+            if lote:
+                self._gravar(lote)
+                if progresso:
+                    progresso(self)
+        finally:
+            # Uma única versão nova do catálogo (e uma limpeza de cache) no fim, mesmo
+            # se a importação parar no meio: por lote, cada worker recarregaria o
+            # snapshot inteiro várias vezes durante a carga. Reimportar um arquivo
+            # já carregado não grava nada e não mexe nos caches.
+            if self.alterado:
+                db.session.rollback()
+                marcar(tudo=True)
+                db.session.commit()
+
+    def _resolver(self, modelo, mapa, nomes, chave, coluna=None):
+        """Cria os nomes cuja chave não está no mapa e lê os ids deles.
+
+        `coluna` é a coluna que guarda a própria chave (nome_normalizado); sem
+        ela, os ids são lidos pelo nome e a chave é calculada aqui.
+        """
+        faltando = {}
+        for nome in nomes:
+            if chave(nome) not in mapa:
+                faltando.setdefault(chave(nome), nome)
+        if not faltando:
+            return
+        resultado = db.session.execute(
+            insert_ignorando(modelo.__table__), [{"nome": n} for n in faltando.values()]
+        )
+        if resultado.rowcount:
+            self.alterado = True
+        if coluna is None:
+            consulta = select(modelo.nome, modelo.id).where(modelo.nome.in_(faltando.values()))
+            mapa.update((chave(nome), id) for nome, id in db.session.execute(consulta))
+        else:
+            consulta = select(coluna, modelo.id).where(coluna.in_(faltando)).order_by(modelo.id.desc())
+            mapa.update(db.session.execute(consulta).all())
+
+    def _existentes(self, chaves):
+        consulta = select(Musica.id, Musica.artista_id, Musica.titulo).where(
+            tuple_(Musica.artista_id, Musica.titulo).in_(list(chaves))
+        )
+        return {(artista_id, titulo): id for id, artista_id, titulo in db.session.execute(consulta)}
+
+    def _gravar(self, lote):
+        self._resolver(Artista, self.artistas, [artista for _, artista, _ in lote], normalizar,
+                       Artista.nome_normalizado)
+        self._resolver(Genero, self.generos, [g for _, _, generos in lote for g in generos], str.lower)
+
+        musicas = {}
+        for titulo, artista, generos in lote:
+            chave = (self.artistas[normalizar(artista)], titulo)
+            musicas.setdefault(chave, set()).update(self.generos[g.lower()] for g in generos)
+
+        ids = self._existentes(musicas)
+        novas = [chave for chave in musicas if chave not in ids]
+        if novas:
+            db.session.execute(
+                insert(Musica.__table__),
+                [{"artista_id": artista_id, "titulo": titulo} for artista_id, titulo in novas],
+            )
+            ids.update(self._existentes(novas))
+            self.novas += len(novas)
+            self.alterado = True
+
+        pares = [
+            {"musica_id": ids[chave], "genero_id": genero_id}
+            for chave, generos in musicas.items()
+            for genero_id in generos
+            if chave in ids
+        ]
+        if pares and db.session.execute(insert_ignorando(musica_genero), pares).rowcount:
+            self.alterado = True
+
+        db.session.commit()
+        self.lotes += 1
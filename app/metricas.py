@@ -0,0 +1,357 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, request_finished, \
+    request_started, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) do histograma de duração das requisições.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Quantas das consultas mais lentas de cada requisição vão para o log de requisição lenta.
+CONSULTAS_NO_LOG = 3
+# No METRICAS_DIR: contadores acumulados dos workers que já terminaram.
+_MORTOS = "mortos.json"
+
+
+def memoria_processo():
+    """(RSS, PSS) do processo em bytes, ou None onde não há /proc.
+
+    O PSS divide as páginas compartilhadas entre os processos que as usam,
+    então a soma do PSS dos workers é a memória real do servidor.
+    """
+    valores = {}
+    try:
+        with open("/proc/self/smaps_rollup") as arquivo:
+            for linha in arquivo:
+                campo, _, resto = linha.partition(":")
+                if campo in ("Rss", "Pss"):
+                    valores[campo] = int(resto.split()[0]) * 1024
+    except OSError:
+        return None, None
+    return valores.get("Rss"), valores.get("Pss")
+
+
+class _Endpoint:
+    __slots__ = ("requisicoes", "segundos", "buckets", "sql_consultas", "sql_segundos", "template_segundos")
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.segundos = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.sql_consultas = 0
+        self.sql_segundos = 0.0
+        self.template_segundos = 0.0
+
+    def como_dict(self):
+        dados = {campo: getattr(self, campo) for campo in self.__slots__}
+        dados["buckets"] = list(self.buckets)
+        return dados
+
+    def somar(self, dados):
+        for campo in self.__slots__:
+            if campo == "buckets":
+                self.buckets = [a + b for a, b in zip(self.buckets, dados[campo])]
+            else:
+                setattr(self, campo, getattr(self, campo) + dados[campo])
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _com_pid(serie, pid):
+    if serie.endswith("}"):
+        return f'{serie[:-1]},pid="{pid}"}}'
+    return f'{serie}{{pid="{pid}"}}'
+
+
+def _juntar(estados, por_pid):
+    """Soma os estados de vários processos: ({endpoint: _Endpoint}, linhas das fontes).
+
+    Counters das fontes são somados. Gauges não se somam: com `por_pid`
+    cada um ganha o rótulo pid e só entram os de processos vivos.
+    """
+    endpoints = defaultdict(_Endpoint)
+    tipos, series = {}, {}
+    for estado in estados:
+        for nome, dados in estado["endpoints"].items():
+            endpoints[nome].somar(dados)
+        pid = estado["pid"]
+        for linha in estado["fontes"]:
+            if linha.startswith("# TYPE "):
+                _, _, metrica, tipo = linha.split()
+                tipos.setdefault(metrica, tipo)
+                series.setdefault(metrica, {})
+                continue
+            if linha.startswith("#"):
+                continue
+            serie, _, valor = linha.rpartition(" ")
+            metrica = serie.partition("{")[0]
+            valores = series.setdefault(metrica, {})
+            if tipos.get(metrica) == "counter":
+                valores[serie] = valores.get(serie, 0) + json.loads(valor)
+            elif not por_pid:
+                valores[serie] = valor
+            elif pid is not None and _vivo(pid):
+                valores[_com_pid(serie, pid)] = valor
+    linhas = []
+    for metrica, valores in series.items():
+        if not valores:
+            continue
+        if metrica in tipos:
+            linhas.append(f"# TYPE {metrica} {tipos[metrica]}")
+        linhas.extend(f"{serie} {valor}" for serie, valor in valores.items())
+    return endpoints, linhas
+
+
+class Metricas:
+    """Tempo de parede, SQL e templates por endpoint, expostos no formato do Prometheus.
+
+    Os contadores de cada requisição vivem em `g` e só são somados ao
+    agregado (sob lock) no fim da requisição; por consulta o custo é um
+    par de perf_counter().
+
+    Com vários workers, cada um só conhece as próprias requisições. Com
+    METRICAS_DIR (que `flask serve` cria se não for dado), cada processo grava
+    o seu estado em <pid>.json no máximo a cada METRICAS_GRAVAR_S segundos, e
+    a exposição, em qualquer worker, soma os arquivos de todos. Os contadores
+    de um worker que termina normalmente vão para mortos.json; os de um
+    worker morto à força continuam no arquivo dele. Gauges (memória, tempo de
+    aquecimento) não se somam: saem com o rótulo pid, só dos processos vivos.
+    """
+
+    def __init__(self):
+        self.ativas = False
+        self.aquecimento = None
+        self.limiar_lento = 1.0
+        self.diretorio = None
+        self.gravar_a_cada = 5.0
+        self._gravado_em = 0.0
+        self._endpoints = defaultdict(_Endpoint)
+        self._lock = threading.Lock()
+        self._fontes = []
+
+    def init_app(self, app):
+        self.ativas = app.config['METRICAS_ATIVAS']
+        self.limiar_lento = app.config['METRICAS_LIMIAR_LENTO_MS'] / 1000
+        self.diretorio = app.config['METRICAS_DIR']
+        self.gravar_a_cada = app.config['METRICAS_GRAVAR_S']
+        if not self.ativas:
+            return
+        request_started.connect(self._inicio_requisicao, app, weak=False)
+        request_finished.connect(self._fim_requisicao, app, weak=False)
+        before_render_template.connect(self._inicio_template, app, weak=False)
+        template_rendered.connect(self._fim_template, app, weak=False)
+        # Os eventos de Engine são globais: uma segunda aplicação não pode contar cada consulta duas vezes.
+        if not event.contains(Engine, "before_cursor_execute", self._inicio_consulta):
+            event.listen(Engine, "before_cursor_execute", self._inicio_consulta)
+            event.listen(Engine, "after_cursor_execute", self._fim_consulta)
+
+    def totais(self):
+        """{endpoint: (requisições, consultas SQL)} acumulados neste processo."""
+        with self._lock:
+            return {nome: (e.requisicoes, e.sql_consultas) for nome, e in self._endpoints.items()}
+
+    def registrar_fonte(self, func):
+        """Registra `func()` que devolve linhas extras (gauges/counters) para a exposição.
+
+        Cada série deve vir depois da sua linha `# TYPE`, que diz se ela é somada entre os processos.
+        """
+        self._fontes.append(func)
+        return func
+
+    def compartilhar(self, diretorio):
+        """Passa a juntar as métricas dos processos que gravam em `diretorio`.
+
+        Chamado no mestre antes do fork; os arquivos de uma execução anterior são apagados.
+        """
+        os.makedirs(diretorio, exist_ok=True)
+        for nome in os.listdir(diretorio):
+            if nome.endswith(".json"):
+                os.remove(os.path.join(diretorio, nome))
+        self.diretorio = diretorio
+
+    def gravar(self):
+        """Grava o estado deste processo em <METRICAS_DIR>/<pid>.json."""
+        if self.diretorio is None:
+            return
+        self._gravado_em = time.monotonic()
+        try:
+            self._escrever(f"{os.getpid()}.json", self._estado())
+        except OSError:
+            logger.exception("Falha ao gravar as métricas em %s", self.diretorio)
+
+    def encerrar(self):
+        """Na saída do worker: soma os contadores dele aos dos workers que já terminaram."""
+        if self.diretorio is None:
+            return
+        estados = [dict(self._estado(), pid=None)]
+        with self._trava(exclusiva=True):
+            try:
+                with open(os.path.join(self.diretorio, _MORTOS)) as arquivo:
+                    estados.append(json.load(arquivo))
+            except FileNotFoundError:
+                pass
+            endpoints, fontes = _juntar(estados, por_pid=True)
+            self._escrever(_MORTOS, {
+                "pid": None,
+                "endpoints": {nome: e.como_dict() for nome, e in endpoints.items()},
+                "fontes": fontes,
+            })
+            try:
+                os.remove(os.path.join(self.diretorio, f"{os.getpid()}.json"))
+            except FileNotFoundError:
+                pass
+
+    def _estado(self):
+        with self._lock:
+            endpoints = {nome: e.como_dict() for nome, e in self._endpoints.items()}
+        fontes = [linha for fonte in self._fontes for linha in fonte()]
+        return {"pid": os.getpid(), "endpoints": endpoints, "fontes": fontes}
+
+    def _estados(self):
+        if self.diretorio is None:
+            return [self._estado()]
+        self.gravar()
+        estados = []
+        with self._trava(exclusiva=False):
+            for nome in os.listdir(self.diretorio):
+                if not nome.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.diretorio, nome)) as arquivo:
+                        estados.append(json.load(arquivo))
+                except (OSError, ValueError):
+                    logger.warning("Métricas ilegíveis em %s", nome)
+        return estados
+
+    def _escrever(self, nome, estado):
+        # Arquivo temporário + rename: quem lê nunca vê um JSON pela metade.
+        caminho = os.path.join(self.diretorio, nome)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "w") as arquivo:
+            json.dump(estado, arquivo)
+        os.replace(temporario, caminho)
+
+    @contextmanager
+    def _trava(self, exclusiva):
+        # Impede que a exposição leia os contadores de um worker no arquivo dele e em mortos.json ao mesmo tempo.
+        import fcntl
+
+        with open(os.path.join(self.diretorio, ".trava"), "a") as arquivo:
+            fcntl.flock(arquivo, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+            yield
+
+    def _inicio_requisicao(self, sender, **extra):
+        if not self.ativas:
+            return
+        g._metricas = {"inicio": time.perf_counter(), "sql_n": 0, "sql_s": 0.0, "tpl_s": 0.0, "lentas": []}
+
+    def _fim_requisicao(self, sender, response, **extra):
+        dados = g.get("_metricas")
+        if dados is None:
+            return
+        requisicao = (request.method, request.path, request.endpoint or "desconhecido")
+        if response.is_streamed:
+            # O corpo ainda nem começou a ser gerado (stream_with_context): o tempo e as
+            # consultas da geração só terminam quando o servidor fecha a resposta.
+            response.call_on_close(lambda: self._registrar(dados, *requisicao))
+        else:
+            g.pop("_metricas")
+            self._registrar(dados, *requisicao)
+
+    def _registrar(self, dados, metodo, caminho, endpoint):
+        duracao = time.perf_counter() - dados["inicio"]
+        with self._lock:
+            e = self._endpoints[endpoint]
+            e.requisicoes += 1
+            e.segundos += duracao
+            e.sql_consultas += dados["sql_n"]
+            e.sql_segundos += dados["sql_s"]
+            e.template_segundos += dados["tpl_s"]
+            for i, limite in enumerate(BUCKETS):
+                if duracao <= limite:
+                    e.buckets[i] += 1
+                    break
+        if self.diretorio is not None and time.monotonic() >= self._gravado_em + self.gravar_a_cada:
+            self.gravar()
+        if duracao >= self.limiar_lento:
+            lentas = sorted(dados["lentas"], reverse=True)
+            logger.warning(
+                "Requisição lenta: %s %s (%s) %.0fms, %d consultas SQL em %.0fms, template %.0fms%s",
+                metodo, caminho, endpoint, duracao * 1000, dados["sql_n"],
+                dados["sql_s"] * 1000, dados["tpl_s"] * 1000,
+                "".join(f"\n  {s * 1000:.1f}ms: {sql}" for s, sql in lentas),
+            )
+
+    def _inicio_template(self, sender, template, context, **extra):
+        if has_request_context() and "_metricas" in g:
+            g._metricas.setdefault("tpl_inicio", []).append(time.perf_counter())
+
+    def _fim_template(self, sender, template, context, **extra):
+        if has_request_context() and "_metricas" in g and g._metricas.get("tpl_inicio"):
+            g._metricas["tpl_s"] += time.perf_counter() - g._metricas["tpl_inicio"].pop()
+
+    def _inicio_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        # No contexto da execução, e não na conexão: uma consulta que falha não
+        # dispara after_cursor_execute e deixaria um início órfão no pool.
+        if context is not None:
+            context._metricas_inicio = time.perf_counter()
+
+    def _fim_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, "_metricas_inicio", None)
+        if inicio is None or not has_request_context() or "_metricas" not in g:
+            return
+        duracao = time.perf_counter() - inicio
+        dados = g._metricas
+        dados["sql_n"] += 1
+        dados["sql_s"] += duracao
+        lentas = dados["lentas"]
+        if len(lentas) < CONSULTAS_NO_LOG:
+            heapq.heappush(lentas, (duracao, statement))
+        elif duracao > lentas[0][0]:
+            heapq.heapreplace(lentas, (duracao, statement))
+
+    def texto_prometheus(self):
+        endpoints, fontes = _juntar(self._estados(), por_pid=self.diretorio is not None)
+        endpoints = sorted(endpoints.items())
+        linhas = [
+            "# HELP sync_requisicao_segundos Duração das requisições por endpoint.",
+            "# TYPE sync_requisicao_segundos histogram",
+        ]
+        for nome, e in endpoints:
+            acumulado = 0
+            for limite, n in zip(BUCKETS, e.buckets):
+                acumulado += n
+                linhas.append(f'sync_requisicao_segundos_bucket{{endpoint="{nome}",le="{limite}"}} {acumulado}')
+            linhas.append(f'sync_requisicao_segundos_bucket{{endpoint="{nome}",le="+Inf"}} {e.requisicoes}')
+            linhas.append(f'sync_requisicao_segundos_sum{{endpoint="{nome}"}} {e.segundos:.6f}')
+            linhas.append(f'sync_requisicao_segundos_count{{endpoint="{nome}"}} {e.requisicoes}')
+        for metrica, ajuda, atributo in (
+            ("sync_sql_consultas_total", "Consultas SQL executadas.", "sql_consultas"),
+            ("sync_sql_segundos_total", "Tempo gasto em consultas SQL.", "sql_segundos"),
+            ("sync_template_segundos_total", "Tempo gasto renderizando templates.", "template_segundos"),
+        ):
+            linhas.append(f"# HELP {metrica} {ajuda}")
+            linhas.append(f"# TYPE {metrica} counter")
+            for nome, e in endpoints:
+                linhas.append(f'{metrica}{{endpoint="{nome}"}} {getattr(e, atributo)}')
+        linhas.extend(fontes)
+        return "\n".join(linhas) + "\n"
+
+metricas = Metricas()
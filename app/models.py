@@ -1,9 +1,12 @@
 from app import db
+from app.texto import normalizar
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
 
 musica_genero = db.Table('musica_genero',
     db.Column('musica_id', db.Integer, db.ForeignKey('musica.id'), primary_key=True),
-    db.Column('genero_id', db.Integer, db.ForeignKey('genero.id'), primary_key=True)
+    db.Column('genero_id', db.Integer, db.ForeignKey('genero.id'), primary_key=True),
+    db.Index('ix_musica_genero_genero_id', 'genero_id')
 )
 
 class User(db.Model, UserMixin):
@@ -24,13 +27,30 @@ class Genero(db.Model):
                               back_populates='generos')
 
 
+def _nome_normalizado(contexto):
+    return normalizar(contexto.get_current_parameters()['nome'])
+
+
 class Artista(db.Model):
+    __table_args__ = (db.Index('ix_artista_nome_normalizado', 'nome_normalizado'),)
+
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(150), unique=True, nullable=False)
+    # Chave de busca por nome (sem caixa nem acentos), calculada em Python nos dois lados da comparação.
+    # Não é única: "Djavan" e "DJAVAN" podem coexistir; a busca fica com o de menor id.
+    # O default cobre inserts em lote pelo Core; o validates, alterações pelo ORM.
+    nome_normalizado = db.Column(db.String(150), default=_nome_normalizado)
     musicas = db.relationship("Musica", backref="artista", lazy=True)
 
+    @validates('nome')
+    def _normalizar_nome(self, chave, nome):
+        self.nome_normalizado = normalizar(nome)
+        return nome
+
 
 class Musica(db.Model):
+    __table_args__ = (db.Index('ix_musica_artista_id_titulo', 'artista_id', 'titulo'),)
+
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(150), nullable=False)
     artista_id = db.Column(db.Integer, db.ForeignKey("artista.id"), nullable=False)
@@ -39,6 +59,8 @@ class Musica(db.Model):
 
 
 class UserGenero(db.Model):
+    __table_args__ = (db.Index('uq_user_genero_usuario_genero', 'usuario_id', 'genero_id', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     genero_id = db.Column(db.Integer, db.ForeignKey("genero.id"))
@@ -47,8 +69,47 @@ class UserGenero(db.Model):
 
 
 class UserArtista(db.Model):
+    __table_args__ = (db.Index('uq_user_artista_usuario_artista', 'usuario_id', 'artista_id', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     artista_id = db.Column(db.Integer, db.ForeignKey("artista.id"))
     usuario = db.relationship("User", back_populates="artistas")
-    artista = db.relationship("Artista")
\ No newline at end of file
+    artista = db.relationship("Artista")
+
+class ArtistaSimilar(db.Model):
+    """Vizinhos mais próximos de cada artista, gravados por `flask catalog similar`."""
+    __table_args__ = (db.Index('ix_artista_similar_similar_id', 'similar_id'),)
+
+    artista_id = db.Column(db.Integer, db.ForeignKey("artista.id"), primary_key=True)
+    posicao = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    similar_id = db.Column(db.Integer, db.ForeignKey("artista.id"), nullable=False)
+    pontuacao = db.Column(db.Float, nullable=False)
+
+
+class ArtistaPendente(db.Model):
+    """Artistas cujo público mudou desde o último cálculo de similares."""
+    __table_args__ = (db.Index('uq_artista_pendente_artista_id', 'artista_id', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    artista_id = db.Column(db.Integer, nullable=False)
+
+
+class CatalogoVersao(db.Model):
+    """Linha única (id=1) com a versão do catálogo, incrementada a cada commit que o altera."""
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ItemAlterado(db.Model):
+    """Instante (em µs) da última alteração de cada item que os caches dos workers guardam.
+
+    `tipo` é 'usuario', 'genero' ou 'artista'; 'tudo' e 'similares' usam
+    item_id=0. Cada commit atualiza a linha dos itens que tocou, no lugar.
+    """
+    __table_args__ = (db.Index('ix_item_alterado_alterado_em', 'alterado_em'),)
+
+    tipo = db.Column(db.String(20), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    alterado_em = db.Column(db.BigInteger, nullable=False)
@@ -0,0 +1,97 @@
+from sqlalchemy import delete, insert, select
+
+from app import db
+from app.catalogo import catalogo
+from app.eventos import marcar
+from app.importacao import insert_ignorando
+from app.models import Artista, Genero, UserArtista, UserGenero
+from app.similares import marcar_pendentes
+from app.texto import normalizar
+
+
+def ler_formulario(form):
+    """Extrai (genero_ids, nomes_artistas) do formulário de gostos."""
+    genero_ids = {int(g) for g in form.getlist("generos") if g.isdigit()}
+    nomes = [nome.strip() for nome in form.get("artistas", "").split(",") if nome.strip()]
+    return genero_ids, nomes
+
+
+def preferencias_atuais(usuario_id):
+    """Ids dos gêneros e nomes dos artistas escolhidos, em duas consultas sem join (os nomes vêm do snapshot)."""
+    genero_ids = set(db.session.scalars(
+        select(UserGenero.genero_id).where(UserGenero.usuario_id == usuario_id)
+    ))
+    artista_ids = db.session.scalars(
+        select(UserArtista.artista_id).where(UserArtista.usuario_id == usuario_id).order_by(UserArtista.id)
+    ).all()
+    artistas = catalogo.atual().artistas
+    # Artistas recém-criados podem ainda não estar no snapshot, que é recarregado em segundo plano.
+    novos = [id for id in artista_ids if id not in artistas]
+    extras = dict(db.session.execute(
+        select(Artista.id, Artista.nome).where(Artista.id.in_(novos))
+    ).all()) if novos else {}
+    return genero_ids, [artistas.get(id) or extras[id] for id in artista_ids if id in artistas or id in extras]
+
+
+def _resolver_artistas(nomes):
+    # Uma consulta por nome_normalizado, com a chave calculada aqui igual à gravada.
+    por_chave = {}
+    for nome in nomes:
+        chave = normalizar(nome)
+        if chave:
+            por_chave.setdefault(chave, nome)
+    if not por_chave:
+        return set()
+
+    # Em ordem decrescente de id: com nomes que só diferem na caixa ou nos acentos, fica o mais antigo.
+    encontrados = dict(db.session.execute(
+        select(Artista.nome_normalizado, Artista.id)
+        .where(Artista.nome_normalizado.in_(por_chave))
+        .order_by(Artista.id.desc())
+    ).all())
+    faltando = [chave for chave in por_chave if chave not in encontrados]
+    if not faltando:
+        return set(encontrados.values())
+
+    db.session.execute(insert_ignorando(Artista.__table__), [{"nome": por_chave[c]} for c in faltando])
+    novos = db.session.scalars(
+        select(Artista.id).where(Artista.nome_normalizado.in_(faltando))
+    ).all()
+    # Só os que não existiam no primeiro SELECT mudam o catálogo.
+    if novos:
+        marcar(artistas=novos)
+    return set(encontrados.values()) | set(novos)
+
+
+def _sincronizar(modelo, coluna, usuario_id, desejados):
+    atuais = set(db.session.scalars(select(coluna).where(modelo.usuario_id == usuario_id)))
+    removidos = atuais - desejados
+    adicionados = desejados - atuais
+    if removidos:
+        db.session.execute(
+            delete(modelo).where(modelo.usuario_id == usuario_id, coluna.in_(removidos))
+        )
+    if adicionados:
+        db.session.execute(
+            insert(modelo.__table__),
+            [{"usuario_id": usuario_id, coluna.key: id} for id in adicionados],
+        )
+    return removidos | adicionados
+
+
+def salvar_preferencias(usuario_id, genero_ids, nomes_artistas):
+    """Grava só a diferença entre as preferências atuais e as escolhidas.
+
+    O custo é um número fixo de comandos, independente de quantos gêneros e
+    artistas foram escolhidos: nada de uma consulta por artista digitado.
+    """
+    genero_ids = set(db.session.scalars(select(Genero.id).where(Genero.id.in_(genero_ids))))
+    artista_ids = _resolver_artistas(nomes_artistas)
+
+    generos_alterados = _sincronizar(UserGenero, UserGenero.genero_id, usuario_id, genero_ids)
+    artistas_alterados = _sincronizar(UserArtista, UserArtista.artista_id, usuario_id, artista_ids)
+    if generos_alterados or artistas_alterados:
+        marcar(usuarios=[usuario_id])
+        # Público e perfil de gêneros mudam para todos os favoritos do usuário, não só os alterados.
+        marcar_pendentes(artista_ids | artistas_alterados)
+    db.session.commit()
@@ -0,0 +1,174 @@
+import base64
+import binascii
+import bisect
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from app import db
+from app.cache import cache_recomendacoes
+from app.catalogo import catalogo
+from app.models import Musica, UserArtista, UserGenero
+
+# Cada gênero em comum vale 1 ponto; o artista favorito pesa mais que um gênero.
+PESO_ARTISTA = 3
+
+# Registro imutável e desligado da sessão, que pode ficar no cache entre requisições.
+Recomendacao = namedtuple("Recomendacao", "id titulo artista_id artista generos pontos")
+
+
+def codificar_cursor(pontos, musica_id):
+    bruto = f"{pontos}:{musica_id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        pontos, musica_id = bruto.split(":")
+        return int(pontos), int(musica_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def preferencias(usuario_id):
+    genero_ids = db.session.scalars(
+        select(UserGenero.genero_id).where(UserGenero.usuario_id == usuario_id)
+    ).all()
+    artista_ids = db.session.scalars(
+        select(UserArtista.artista_id).where(UserArtista.usuario_id == usuario_id)
+    ).all()
+    return genero_ids, artista_ids
+
+
+def candidatas(snapshot, genero_ids, artista_ids):
+    """Lista ordenada de (-pontos, musica_id) das músicas candidatas, melhores primeiro.
+
+    As candidatas são todas as músicas dos artistas escolhidos e, de cada
+    gênero escolhido, só as melhores guardadas no snapshot
+    (RECOMENDACOES_CANDIDATOS_POR_GENERO). O custo fica limitado por esse
+    teto vezes o número de gêneros, mais as músicas dos artistas, e não
+    cresce com o catálogo; a pontuação de cada candidata é a exata.
+    """
+    escolhidos = frozenset(genero_ids)
+    dos_artistas = set()
+    for artista_id in artista_ids:
+        dos_artistas.update(snapshot.musicas_por_artista.get(artista_id))
+    todas = set(dos_artistas)
+    for genero_id in escolhidos:
+        todas.update(snapshot.musicas_por_genero.get(genero_id))
+
+    pontuadas = []
+    for musica_id in todas:
+        pontos = len(escolhidos.intersection(snapshot.generos_por_musica.get(musica_id)))
+        if musica_id in dos_artistas:
+            pontos += PESO_ARTISTA
+        pontuadas.append((-pontos, musica_id))
+    pontuadas.sort()
+    return pontuadas
+
+
+def _apos(pontuadas, cursor):
+    apos = decodificar_cursor(cursor)
+    if apos is None:
+        return 0
+    pontos, musica_id = apos
+    return bisect.bisect_right(pontuadas, (-pontos, musica_id))
+
+
+def _registros(snapshot, pontuadas):
+    """Recomendacao de cada (-pontos, musica_id), numa consulta pela chave primária.
+
+    Músicas apagadas depois da carga do snapshot ficam de fora.
+    """
+    linhas = {
+        linha.id: linha
+        for linha in db.session.execute(
+            select(Musica.id, Musica.titulo, Musica.artista_id)
+            .where(Musica.id.in_([musica_id for _, musica_id in pontuadas]))
+        )
+    }
+    return [
+        Recomendacao(
+            id=musica_id,
+            titulo=linhas[musica_id].titulo,
+            artista_id=linhas[musica_id].artista_id,
+            artista=snapshot.artistas.get(linhas[musica_id].artista_id, ""),
+            generos=tuple(snapshot.generos_da_musica(musica_id)),
+            pontos=-negativo,
+        )
+        for negativo, musica_id in pontuadas
+        if musica_id in linhas
+    ]
+
+
+def recomendar(usuario_id, limite=20, cursor=None):
+    """Retorna (recomendacoes, proximo_cursor) com a página de recomendações do usuário.
+
+    Candidatas, pontuação e ordem saem do snapshot do catálogo (ver
+    `candidatas`); o banco só é consultado para as preferências e para os
+    títulos da página, por chave primária. Páginas já montadas saem do cache
+    até que algo de que dependem mude.
+    """
+    chave = (usuario_id, cursor, limite)
+    pagina = cache_recomendacoes.obter(chave)
+    if pagina is not None:
+        return pagina
+
+    genero_ids, artista_ids = preferencias(usuario_id)
+    versao = None
+    if not genero_ids and not artista_ids:
+        pagina = ((), None)
+    else:
+        snapshot = catalogo.atual()
+        versao = snapshot.versao
+        pontuadas = candidatas(snapshot, genero_ids, artista_ids)
+        inicio = _apos(pontuadas, cursor)
+        trecho = pontuadas[inicio:inicio + limite]
+
+        proximo_cursor = None
+        if len(pontuadas) > inicio + limite:
+            negativo, musica_id = trecho[-1]
+            proximo_cursor = codificar_cursor(-negativo, musica_id)
+        pagina = (tuple(_registros(snapshot, trecho)), proximo_cursor)
+
+    recomendacoes = pagina[0]
+    cache_recomendacoes.guardar(
+        chave,
+        pagina,
+        generos={*genero_ids, *(g for r in recomendacoes for g, _ in r.generos)},
+        artistas={*artista_ids, *(r.artista_id for r in recomendacoes)},
+        versao=versao,
+    )
+    return pagina
+
+
+def como_dict(recomendacao):
+    return {
+        "id": recomendacao.id,
+        "titulo": recomendacao.titulo,
+        "artista": {"id": recomendacao.artista_id, "nome": recomendacao.artista},
+        "generos": [{"id": id, "nome": nome} for id, nome in recomendacao.generos],
+        "pontos": recomendacao.pontos,
+    }
+
+
+def percorrer(usuario_id, cursor=None, limite=None, lote=200):
+    """Gera (recomendacao, cursor) a partir de `cursor`, lendo `lote` títulos por vez.
+
+    A lista de candidatas já é limitada (ver `candidatas`); os títulos são
+    lidos lote a lote, então quem consome o gerador não segura a página
+    inteira. O cursor de cada item permite retomar logo depois dele.
+    """
+    genero_ids, artista_ids = preferencias(usuario_id)
+    if not genero_ids and not artista_ids:
+        return
+    snapshot = catalogo.atual()
+    pontuadas = candidatas(snapshot, genero_ids, artista_ids)
+    inicio = _apos(pontuadas, cursor)
+    fim = len(pontuadas) if limite is None else min(len(pontuadas), inicio + limite)
+    for posicao in range(inicio, fim, lote):
+        for recomendacao in _registros(snapshot, pontuadas[posicao:min(posicao + lote, fim)]):
+            yield recomendacao, codificar_cursor(recomendacao.pontos, recomendacao.id)
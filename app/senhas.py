@@ -0,0 +1,76 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from app import bcrypt
+
+
+class SenhaOcupada(Exception):
+    """Todos os trabalhadores e vagas da fila estão ocupados."""
+
+
+class ServicoSenhas:
+    """Executa o bcrypt num pool limitado de threads, fora da thread da requisição.
+
+    O bcrypt libera o GIL enquanto calcula, então no máximo `trabalhadores`
+    hashes disputam CPU ao mesmo tempo; o resto do site continua sendo
+    atendido durante um pico de logins. Quem não consegue vaga em
+    `timeout` segundos recebe SenhaOcupada em vez de enfileirar sem limite.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.timeout = 5
+        self.trabalhadores = 2
+        self.fila = 16
+        self._executor = None
+        self._vagas = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.trabalhadores = app.config['SENHA_TRABALHADORES']
+        self.fila = app.config['SENHA_FILA']
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.timeout = app.config['SENHA_TIMEOUT']
+
+    def _pool(self):
+        # Criado no processo que usa: as threads de um pool não sobrevivem ao fork dos workers.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.trabalhadores, thread_name_prefix="bcrypt")
+                    self._vagas = threading.BoundedSemaphore(self.trabalhadores + self.fila)
+                    self._pid = os.getpid()
+        return self._executor, self._vagas
+
+    def _executar(self, func, *args):
+        executor, vagas = self._pool()
+        if not vagas.acquire(timeout=self.timeout):
+            raise SenhaOcupada()
+        try:
+            futuro = executor.submit(func, *args)
+        except BaseException:
+            vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: vagas.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            raise SenhaOcupada()
+
+    def gerar_hash(self, senha):
+        return self._executar(bcrypt.generate_password_hash, senha, self.rounds).decode('utf-8')
+
+    def verificar(self, senha_hash, senha):
+        return self._executar(bcrypt.check_password_hash, senha_hash, senha)
+
+    def precisa_rehash(self, senha_hash):
+        # Formato $2b$<custo>$...: rehash quando o custo configurado mudou.
+        try:
+            return int(senha_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+senhas = ServicoSenhas()
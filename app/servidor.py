@@ -0,0 +1,106 @@
+import gc
+import os
+import tempfile
+import time
+
+from app import db
+from app.busca import indice_artistas
+from app.catalogo import catalogo
+from app.metricas import memoria_processo, metricas
+
+
+def mb(valor):
+    return "?" if valor is None else f"{valor / 2**20:.1f}MB"
+
+
+def aquecer(app):
+    """Carrega no processo mestre o que todo worker usaria, antes do fork.
+
+    O snapshot do catálogo e o índice de artistas passam a ser páginas
+    compartilhadas (copy-on-write) entre os workers, que já nascem prontos
+    para responder. As conexões abertas aqui são fechadas: um socket herdado
+    por vários processos corromperia o protocolo do banco.
+    """
+    inicio = time.perf_counter()
+    with app.app_context():
+        catalogo.atual()
+        indice_artistas.atualizar()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # Objetos congelados saem das varreduras do gc, que de outro modo tocariam
+    # (e copiariam) as páginas compartilhadas em cada worker.
+    gc.collect()
+    gc.freeze()
+    metricas.aquecimento = time.perf_counter() - inicio
+    return metricas.aquecimento
+
+
+def opcoes(app, workers=None, threads=None, bind=None):
+    """Configuração do gunicorn a partir de SERVIDOR_* (os argumentos têm precedência)."""
+    max_requisicoes = app.config['SERVIDOR_MAX_REQUISICOES']
+
+    def post_fork(server, worker):
+        # Descarta, sem fechar, qualquer conexão herdada do mestre; o pool recomeça vazio no worker.
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        rss, pss = memoria_processo()
+        server.log.info("Worker %s iniciado (RSS %s, PSS %s)", worker.pid, mb(rss), mb(pss))
+
+    def worker_exit(server, worker):
+        metricas.encerrar()
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+    return {
+        'bind': bind or app.config['SERVIDOR_BIND'],
+        'workers': workers or app.config['SERVIDOR_WORKERS'],
+        'threads': threads or app.config['SERVIDOR_THREADS'],
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': app.config['SERVIDOR_TIMEOUT'],
+        'graceful_timeout': app.config['SERVIDOR_TIMEOUT_GRACIOSO'],
+        # Reciclar workers limita vazamentos; o jitter evita que todos reiniciem juntos.
+        'max_requests': max_requisicoes,
+        'max_requests_jitter': max_requisicoes // 10,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+def idade_processo():
+    """Segundos desde o exec() do processo (inclui o interpretador e as importações)."""
+    try:
+        with open("/proc/self/stat") as arquivo:
+            # O nome do executável pode ter espaços; os campos contam a partir do ")".
+            campos = arquivo.read().rpartition(")")[2].split()
+        with open("/proc/uptime") as arquivo:
+            uptime = float(arquivo.read().split()[0])
+    except OSError:
+        return None
+    return uptime - int(campos[19]) / os.sysconf("SC_CLK_TCK")
+
+
+def servir(app, **kwargs):
+    """Entrega a aplicação (já aquecida) ao gunicorn: workers pré-forkados com threads.
+
+    /admin/metricas soma as métricas de todos os workers pelo METRICAS_DIR
+    (um diretório temporário novo, se não configurado).
+    """
+    from gunicorn.app.base import BaseApplication
+
+    config = opcoes(app, **kwargs)
+    if metricas.ativas:
+        metricas.compartilhar(app.config['METRICAS_DIR'] or tempfile.mkdtemp(prefix="sync-metricas-"))
+
+    class Servidor(BaseApplication):
+        def load_config(self):
+            for chave, valor in config.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            return app
+
+    Servidor().run()
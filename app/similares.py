@@ -0,0 +1,211 @@
+from itertools import chain
+
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.cache import cache_recomendacoes
+from app.catalogo import catalogo
+from app.eventos import marcar
+from app.importacao import insert_ignorando
+from app.models import ArtistaPendente, ArtistaSimilar, UserArtista, UserGenero
+
+# Peso do perfil de gêneros do público na pontuação; o resto vem dos ouvintes em comum.
+PESO_GENEROS = 0.2
+# Segundo elemento das chaves no cache de recomendações (o das páginas é o cursor).
+_RELACIONADOS = object()
+
+
+def marcar_pendentes(artista_ids):
+    """Agenda os artistas para o próximo `flask catalog similar` incremental.
+
+    Um artista já pendente não ganha outra linha: a tabela cresce com o
+    número de artistas afetados, não com o número de gravações.
+    """
+    if artista_ids:
+        db.session.execute(
+            insert_ignorando(ArtistaPendente.__table__), [{"artista_id": id} for id in artista_ids]
+        )
+
+
+def relacionados(usuario_id, limite):
+    """Até `limite` pares (id, nome) parecidos com os artistas favoritos do usuário.
+
+    Lê só os k vizinhos já calculados de cada favorito (pela chave primária),
+    então o custo não depende do tamanho do catálogo nem da base de usuários.
+    """
+    chave = (usuario_id, _RELACIONADOS, limite)
+    sugeridos = cache_recomendacoes.obter(chave)
+    if sugeridos is not None:
+        return sugeridos
+
+    favoritos = select(UserArtista.artista_id).where(UserArtista.usuario_id == usuario_id)
+    ids = db.session.scalars(
+        select(ArtistaSimilar.similar_id)
+        .where(ArtistaSimilar.artista_id.in_(favoritos), ArtistaSimilar.similar_id.not_in(favoritos))
+        .group_by(ArtistaSimilar.similar_id)
+        .order_by(func.sum(ArtistaSimilar.pontuacao).desc(), ArtistaSimilar.similar_id)
+        .limit(limite)
+    )
+    # Os nomes vêm do snapshot; artistas removidos depois do último cálculo ficam de fora.
+    snapshot = catalogo.atual()
+    sugeridos = tuple((id, snapshot.artistas[id]) for id in ids if id in snapshot.artistas)
+    cache_recomendacoes.guardar(
+        chave, sugeridos, generos=(), artistas={id for id, _ in sugeridos},
+        versao=snapshot.versao, similares=True,
+    )
+    return sugeridos
+
+
+def _pares(coluna_usuario, coluna_item, lote):
+    """Lê os pares (usuario, item) em lotes para dois arrays int64."""
+    import numpy as np
+
+    usuarios, itens = [], []
+    # Direto na conexão: sem o carregamento do ORM, que domina o tempo com milhões de linhas.
+    resultado = db.session.connection().execution_options(yield_per=lote).execute(
+        select(coluna_usuario, coluna_item).where(coluna_item.is_not(None))
+    )
+    for parte in resultado.partitions():
+        bloco = np.fromiter(chain.from_iterable(parte), dtype=np.int64, count=2 * len(parte)).reshape(-1, 2)
+        usuarios.append(bloco[:, 0])
+        itens.append(bloco[:, 1])
+    if not usuarios:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(usuarios), np.concatenate(itens)
+
+
+class CalculoSimilares:
+    """Similaridade item a item entre artistas a partir das preferências dos usuários.
+
+    Monta as matrizes esparsas usuário×artista (A) e usuário×gênero (G) e
+    pontua cada par de artistas com ouvintes em comum pelo cosseno entre as
+    colunas de A, misturado ao cosseno entre os perfis de gênero do público
+    de cada um (Aᵀ G). Aᵀ A é calculada em blocos de linhas, então a memória
+    fica limitada pelo número de preferências e pelo tamanho do bloco, nunca
+    por artistas².
+    """
+
+    def __init__(self, vizinhos=20, bloco=2000, lote=50000, peso_generos=PESO_GENEROS):
+        self.vizinhos = vizinhos
+        self.bloco = bloco
+        self.lote = lote
+        self.peso_generos = peso_generos
+        self.calculados = 0
+        self.gravados = 0
+
+    def executar(self, completo=False):
+        """Recalcula tudo ou só os artistas pendentes (e quem os tem como vizinho).
+
+        No modo incremental só o cálculo dos vizinhos e a gravação se limitam
+        aos alvos: as matrizes A e G (e os perfis de gênero) são sempre
+        montadas com todas as preferências, porque a pontuação de um alvo
+        depende do público inteiro de cada candidato a vizinho.
+        """
+        ultimo_pendente = db.session.scalar(select(func.max(ArtistaPendente.id)))
+        if ultimo_pendente is None:
+            if not completo:
+                return
+            pendentes = set()
+        else:
+            lidos = select(ArtistaPendente.artista_id).where(ArtistaPendente.id <= ultimo_pendente)
+            pendentes = set(db.session.scalars(lidos))
+        alvos = None if completo else pendentes | set(db.session.scalars(
+            select(ArtistaSimilar.artista_id).where(ArtistaSimilar.similar_id.in_(lidos))
+        ))
+        if pendentes:
+            # Os pendentes lidos saem da fila antes do cálculo: quem for marcado
+            # durante a execução ganha uma linha nova e fica para a próxima rodada.
+            db.session.execute(delete(ArtistaPendente).where(ArtistaPendente.id <= ultimo_pendente))
+            db.session.commit()
+        try:
+            self._recalcular(alvos)
+        except BaseException:
+            db.session.rollback()
+            marcar_pendentes(pendentes)
+            db.session.commit()
+            raise
+
+    def _recalcular(self, alvos):
+        import numpy as np
+
+        ids_artistas, A, perfis = self._matrizes()
+        if alvos is None:
+            db.session.execute(delete(ArtistaSimilar))
+            linhas = np.arange(len(ids_artistas))
+        else:
+            alvos = sorted(alvos)
+            for i in range(0, len(alvos), self.lote):
+                db.session.execute(
+                    delete(ArtistaSimilar).where(ArtistaSimilar.artista_id.in_(alvos[i:i + self.lote]))
+                )
+            posicoes = np.searchsorted(ids_artistas, alvos)
+            presentes = posicoes < len(ids_artistas)
+            presentes[presentes] = ids_artistas[posicoes[presentes]] == np.asarray(alvos)[presentes]
+            linhas = posicoes[presentes]
+
+        At = A.T.tocsr()
+        ouvintes = np.asarray(A.sum(axis=0)).ravel()
+        for i in range(0, len(linhas), self.bloco):
+            self._gravar(ids_artistas, *self._vizinhos(linhas[i:i + self.bloco], At, A, ouvintes, perfis))
+
+        # Os artistas relacionados em cache (de qualquer usuário) podem ter mudado, neste
+        # e nos demais processos; as páginas de recomendação e o catálogo continuam valendo.
+        marcar(similares=True)
+        db.session.commit()
+
+    def _matrizes(self):
+        import numpy as np
+        from scipy import sparse
+
+        usuarios_a, artistas = _pares(UserArtista.usuario_id, UserArtista.artista_id, self.lote)
+        usuarios_g, generos = _pares(UserGenero.usuario_id, UserGenero.genero_id, self.lote)
+
+        # Ids viram índices densos: linhas e colunas vazias não custam memória.
+        ids_usuarios = np.unique(np.concatenate([usuarios_a, usuarios_g]))
+        linhas_a = np.searchsorted(ids_usuarios, usuarios_a)
+        linhas_g = np.searchsorted(ids_usuarios, usuarios_g)
+        ids_artistas, colunas_a = np.unique(artistas, return_inverse=True)
+        ids_generos, colunas_g = np.unique(generos, return_inverse=True)
+
+        forma = (len(ids_usuarios), len(ids_artistas))
+        A = sparse.csr_matrix((np.ones(len(linhas_a), dtype=np.float32), (linhas_a, colunas_a)), shape=forma)
+        G = sparse.csr_matrix(
+            (np.ones(len(linhas_g), dtype=np.float32), (linhas_g, colunas_g)),
+            shape=(len(ids_usuarios), len(ids_generos)),
+        )
+        # Perfil de gêneros do público de cada artista, normalizado (artistas × gêneros, denso e pequeno).
+        perfis = np.asarray((A.T @ G).todense(), dtype=np.float32)
+        normas = np.linalg.norm(perfis, axis=1, keepdims=True)
+        np.divide(perfis, normas, out=perfis, where=normas > 0)
+        return ids_artistas, A, perfis
+
+    def _vizinhos(self, linhas, At, A, ouvintes, perfis):
+        """Top-k de um bloco de artistas: (linha, coluna, pontuação, posição)."""
+        import numpy as np
+
+        em_comum = (At[linhas] @ A).tocoo()
+        r, c, n = em_comum.row, em_comum.col, em_comum.data
+        origem = linhas[r]
+        fora_da_diagonal = origem != c
+        r, c, n, origem = r[fora_da_diagonal], c[fora_da_diagonal], n[fora_da_diagonal], origem[fora_da_diagonal]
+
+        cosseno = n / np.sqrt(ouvintes[origem] * ouvintes[c])
+        generos = np.einsum("ij,ij->i", perfis[origem], perfis[c])
+        pontos = (1 - self.peso_generos) * cosseno + self.peso_generos * generos
+
+        # Ordena por (linha, pontuação desc) e guarda as k primeiras de cada linha.
+        ordem = np.lexsort((c, -pontos, r))
+        r, c, pontos, origem = r[ordem], c[ordem], pontos[ordem], origem[ordem]
+        posicao = np.arange(len(r)) - np.searchsorted(r, r)
+        manter = posicao < self.vizinhos
+        self.calculados += len(linhas)
+        return origem[manter], c[manter], pontos[manter], posicao[manter]
+
+    def _gravar(self, ids_artistas, origem, destino, pontos, posicao):
+        registros = [
+            {"artista_id": int(a), "similar_id": int(s), "pontuacao": float(p), "posicao": int(i)}
+            for a, s, p, i in zip(ids_artistas[origem], ids_artistas[destino], pontos, posicao)
+        ]
+        for i in range(0, len(registros), self.lote):
+            db.session.execute(insert(ArtistaSimilar.__table__), registros[i:i + self.lote])
+        self.gravados += len(registros)
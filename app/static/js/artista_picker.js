@@ -0,0 +1,63 @@
+// Seletor de artista assíncrono para os formulários do admin.
+// Marcação esperada: um elemento [data-artista-picker] contendo
+// input[data-busca], input[data-id] (hidden) e div[data-resultados].
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-artista-picker]').forEach(picker => {
+        const busca = picker.querySelector('[data-busca]');
+        const hidden = picker.querySelector('[data-id]');
+        const resultados = picker.querySelector('[data-resultados]');
+        const url = picker.dataset.artistaPicker;
+        let pedido = 0;
+        let espera = null;
+
+        function fechar() {
+            resultados.innerHTML = '';
+            resultados.classList.add('hidden');
+        }
+
+        async function sugerir(termo) {
+            const atual = ++pedido;
+            const response = await fetch(`${url}?q=${encodeURIComponent(termo)}`);
+            const artistas = await response.json();
+            if (atual !== pedido) return;
+
+            resultados.innerHTML = '';
+            if (artistas.length === 0) {
+                fechar();
+                return;
+            }
+            artistas.forEach(artista => {
+                const item = document.createElement('div');
+                item.className = 'px-4 py-2 hover:bg-neutral-600 cursor-pointer border-b border-neutral-600 last:border-0';
+                item.textContent = artista.nome;
+                item.onclick = () => {
+                    busca.value = artista.nome;
+                    hidden.value = artista.id;
+                    busca.setCustomValidity('');
+                    fechar();
+                };
+                resultados.appendChild(item);
+            });
+            resultados.classList.remove('hidden');
+        }
+
+        busca.addEventListener('input', () => {
+            hidden.value = '';
+            clearTimeout(espera);
+            espera = setTimeout(() => sugerir(busca.value), 150);
+        });
+        busca.addEventListener('focusin', () => sugerir(busca.value));
+
+        busca.form.addEventListener('submit', event => {
+            if (!hidden.value) {
+                event.preventDefault();
+                busca.setCustomValidity('Selecione um artista da lista.');
+                busca.reportValidity();
+            }
+        });
+
+        document.addEventListener('click', e => {
+            if (!picker.contains(e.target)) fechar();
+        });
+    });
+});
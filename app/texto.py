@@ -0,0 +1,7 @@
+import unicodedata
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: "Ávila" e "avila" viram a mesma chave."""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold().strip()
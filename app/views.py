@@ -1,57 +1,100 @@
+import hashlib
 import os
-from app import app, db, login_manager, bcrypt
-from flask import render_template, redirect, request, session, flash, url_for, jsonify
+from app import db, login_manager
+from flask import Blueprint, current_app, render_template, redirect, request, session, flash, url_for, jsonify, abort, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
 from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
 from app.models import User, Genero, Artista, Musica, UserGenero, UserArtista
 from app.forms import LoginForm, RegisterForm 
+from app.recomendacoes import como_dict, decodificar_cursor, percorrer, recomendar
+from app.eventos import ao_confirmar, marcar
+from app.cache import cache_recomendacoes, cache_usuarios
+from app.senhas import senhas, SenhaOcupada
+from app.busca import indice_artistas, normalizar
+from app.catalogo import catalogo
+from app.banco import registrar_escrita, somente_leitura
+from app.metricas import memoria_processo, metricas
+from app.preferencias import ler_formulario, preferencias_atuais, salvar_preferencias
+from app.similares import marcar_pendentes, relacionados
+
+bp = Blueprint('main', __name__)
+
+@ao_confirmar
+def ler_do_primario(alteracoes):
+    registrar_escrita()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    dados = cache_usuarios.obter(int(user_id))
+    if dados is None:
+        user = db.session.get(User, int(user_id))
+        if user is not None:
+            cache_usuarios.guardar(user)
+        return user
+    user = User(**dados)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
-@app.route("/")
+@bp.route("/")
+@somente_leitura
 def home():
     if current_user.is_authenticated:
-        user_generos_ids = [ug.genero_id for ug in current_user.generos]
-        user_artistas_ids = [ua.artista_id for ua in current_user.artistas]
-        recomendacoes = Musica.query.filter(
-            Musica.generos.any(Genero.id.in_(user_generos_ids)) |
-            (Musica.artista_id.in_(user_artistas_ids))
-        ).all()
-        
-        return render_template("home.html", recomendacoes=recomendacoes)
+        recomendacoes, proximo_cursor = recomendar(
+            current_user.id,
+            limite=current_app.config['RECOMENDACOES_POR_PAGINA'],
+            cursor=request.args.get('cursor'),
+        )
+        artistas_sugeridos = relacionados(current_user.id, current_app.config['ARTISTAS_SUGERIDOS'])
+
+        return render_template("home.html", recomendacoes=recomendacoes, proximo_cursor=proximo_cursor,
+                               artistas_sugeridos=artistas_sugeridos)
     
     else:
         return render_template("home.html")
-@app.route("/sobre")
+@bp.route("/sobre")
+@somente_leitura
 def sobre():
     return render_template("sobre.html")
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))        
+        return redirect(url_for('main.home'))        
     form = LoginForm() 
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()    
-        if user and bcrypt.check_password_hash(user.senha, form.senha.data):
+        try:
+            senha_valida = user is not None and senhas.verificar(user.senha, form.senha.data)
+            if senha_valida and senhas.precisa_rehash(user.senha):
+                user.senha = senhas.gerar_hash(form.senha.data)
+                db.session.commit()
+        except SenhaOcupada:
+            flash('Muitos acessos no momento. Tente novamente em instantes.', 'danger')
+            return render_template("login.html", form=form), 503
+        if senha_valida:
             login_user(user)
             if not user.generos and not user.artistas:
                  flash('Login com sucesso! Por favor, personalize seus gostos.', 'success')
-                 return redirect(url_for('escolher_gostos'))
-            return redirect(url_for('home'))
+                 return redirect(url_for('main.escolher_gostos'))
+            return redirect(url_for('main.home'))
         else:
             flash('Login inválido. Verifique e-mail e senha.', 'danger') 
     return render_template("login.html", form=form) 
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     form = RegisterForm() 
     if form.validate_on_submit():
-        hashed_senha = bcrypt.generate_password_hash(form.senha.data).decode('utf-8')
+        try:
+            hashed_senha = senhas.gerar_hash(form.senha.data)
+        except SenhaOcupada:
+            flash('Muitos acessos no momento. Tente novamente em instantes.', 'danger')
+            return render_template("register.html", form=form), 503
         is_admin_user = False
         if form.email.data.lower() == 'admin@gmail.com':
             is_admin_user = True
@@ -68,133 +111,193 @@ def register():
         login_user(novo_user) 
         if is_admin_user:
             flash('Conta de Administrador criada com sucesso!', 'success')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
         else:
             flash('Conta criada com sucesso! Agora, personalize seus gostos.', 'success')
-            return redirect(url_for('escolher_gostos')) 
+            return redirect(url_for('main.escolher_gostos')) 
     return render_template("register.html", form=form) 
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
-@app.route("/api/artistas/search")
+@bp.route("/api/artistas/search")
 @login_required
+@somente_leitura
 def api_search_artistas():
     query = request.args.get('q', '').strip()
-    
-    if query:
-        artistas = Artista.query.filter(
-            Artista.nome.ilike(f'%{query}%')
-        ).limit(10).all()
-        return jsonify([artista.nome for artista in artistas])
-        
+    limite = current_app.config['ARTISTAS_BUSCA_LIMITE']
+
+    # Sem termo, as sugestões vêm dos artistas parecidos com os favoritos do usuário.
+    sugeridos = relacionados(current_user.id, limite) if not query else ()
+    indice_artistas.atualizar()
+    chave = hashlib.sha1(f"{limite}:{normalizar(query)}:{sugeridos}".encode()).hexdigest()[:16]
+    etag = f"{indice_artistas.versao}-{chave}"
+    if request.if_none_match.contains(etag):
+        resposta = current_app.response_class(status=304)
     else:
-        artistas = Artista.query.order_by(Artista.nome).all()
-        return jsonify([artista.nome for artista in artistas])
+        artistas = sugeridos or indice_artistas.buscar(query, limite)
+        resposta = jsonify([nome for _, nome in artistas])
+    resposta.set_etag(etag)
+    resposta.cache_control.private = True
+    resposta.cache_control.max_age = current_app.config['ARTISTAS_BUSCA_MAX_AGE']
+    return resposta
 
-@app.route("/escolher-gostos", methods=["GET", "POST"])
+@bp.route("/api/recomendacoes")
+@login_required
+@somente_leitura
+def api_recomendacoes():
+    cursor = request.args.get('cursor') or None
+    if cursor and decodificar_cursor(cursor) is None:
+        abort(400)
+
+    if request.args.get('formato') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        usuario_id = current_user.id
+        limite = request.args.get('limite', type=int)
+        if limite is not None and limite < 1:
+            abort(400)
+
+        def linhas():
+            for recomendacao, proximo in percorrer(usuario_id, cursor, limite, current_app.config['RECOMENDACOES_STREAM_LOTE']):
+                yield current_app.json.dumps({**como_dict(recomendacao), "cursor": proximo}) + "\n"
+
+        return current_app.response_class(stream_with_context(linhas()), mimetype='application/x-ndjson')
+
+    limite = request.args.get('limite', current_app.config['RECOMENDACOES_POR_PAGINA'], type=int)
+    limite = min(max(limite, 1), current_app.config['RECOMENDACOES_API_LIMITE_MAX'])
+    recomendacoes, proximo_cursor = recomendar(current_user.id, limite=limite, cursor=cursor)
+    resposta = jsonify(itens=[como_dict(r) for r in recomendacoes], proximo_cursor=proximo_cursor)
+    resposta.add_etag()
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta.make_conditional(request)
+
+@bp.route("/escolher-gostos", methods=["GET", "POST"])
 @login_required
 def escolher_gostos():
-    generos = Genero.query.all() 
     if request.method == "POST":
-        db.session.query(UserGenero).filter_by(usuario_id=current_user.id).delete()
-        db.session.query(UserArtista).filter_by(usuario_id=current_user.id).delete()
-        generos_selecionados = request.form.getlist("generos")
-        for genero_id in generos_selecionados:
-            db.session.add(UserGenero(usuario_id=current_user.id, genero_id=genero_id))
-        artistas_string = request.form.get("artistas", "")
-        nomes_artistas = [nome.strip() for nome in artistas_string.split(',') if nome.strip()]
-        for nome in nomes_artistas:
-            artista = Artista.query.filter(db.func.lower(Artista.nome) == nome.lower()).first()
-            if not artista:
-                artista = Artista(nome=nome)
-                db.session.add(artista)
-                db.session.flush() 
-            db.session.add(UserArtista(usuario_id=current_user.id, artista_id=artista.id))
-        db.session.commit()
+        salvar_preferencias(current_user.id, *ler_formulario(request.form))
         flash('Preferências salvas! Aproveite suas recomendações.', 'success')
-        return redirect(url_for('home')) 
-    generos_selecionados_ids = [ug.genero_id for ug in current_user.generos]
-    artistas_selecionados = ", ".join([ua.artista.nome for ua in current_user.artistas])
+        return redirect(url_for('main.home')) 
+    generos = catalogo.atual().lista_generos
+    generos_selecionados_ids, artistas_selecionados = preferencias_atuais(current_user.id)
 
     return render_template(
         "escolher_gostos.html", 
         generos=generos,
         generos_selecionados_ids=generos_selecionados_ids,
-        artistas_selecionados=artistas_selecionados
+        artistas_selecionados=", ".join(artistas_selecionados)
     )
 
-@app.route("/perfil", methods=["GET", "POST"])
+@bp.route("/perfil", methods=["GET", "POST"])
 @login_required
 def perfil():
     if request.method == "POST":
-        db.session.query(UserGenero).filter_by(usuario_id=current_user.id).delete()
-        db.session.query(UserArtista).filter_by(usuario_id=current_user.id).delete()
-        generos_selecionados = request.form.getlist("generos")
-        for genero_id in generos_selecionados:
-            db.session.add(UserGenero(usuario_id=current_user.id, genero_id=genero_id))
-        artistas_string = request.form.get("artistas", "")
-        nomes_artistas = [nome.strip() for nome in artistas_string.split(',') if nome.strip()]
-        for nome in nomes_artistas:
-            artista = Artista.query.filter(db.func.lower(Artista.nome) == nome.lower()).first()
-            if not artista:
-                artista = Artista(nome=nome)
-                db.session.add(artista)
-                db.session.flush()
-            db.session.add(UserArtista(usuario_id=current_user.id, artista_id=artista.id))
-        db.session.commit()
+        salvar_preferencias(current_user.id, *ler_formulario(request.form))
         flash('Preferências atualizadas com sucesso!', 'success')
-        return redirect(url_for('perfil'))
-    generos = Genero.query.all()
-    generos_selecionados_ids = [ug.genero_id for ug in current_user.generos]
-    artistas_selecionados = ", ".join([ua.artista.nome for ua in current_user.artistas])
+        return redirect(url_for('main.perfil'))
+    generos = catalogo.atual().lista_generos
+    generos_selecionados_ids, artistas_selecionados = preferencias_atuais(current_user.id)
 
     return render_template(
         "perfil.html", 
         generos=generos,
         generos_selecionados_ids=generos_selecionados_ids,
-        artistas_selecionados=artistas_selecionados
+        artistas_selecionados=", ".join(artistas_selecionados)
     )
 
-@app.route("/perfil/excluir", methods=["POST"])
+@bp.route("/perfil/excluir", methods=["POST"])
 @login_required
 def excluir_conta():
-    db.session.query(UserGenero).filter_by(usuario_id=current_user.id).delete()
-    db.session.query(UserArtista).filter_by(usuario_id=current_user.id).delete()
-    user = User.query.get(current_user.id)
+    # current_user pode ter vindo do cache de usuários: a linha é conferida no banco.
+    user = db.session.get(User, current_user.id, populate_existing=True)
+    if user is None:
+        logout_user()
+        flash('Sua conta já havia sido excluída.', 'danger')
+        return redirect(url_for('main.home'))
+    db.session.query(UserGenero).filter_by(usuario_id=user.id).delete()
+    marcar_pendentes([id for id, in db.session.query(UserArtista.artista_id).filter_by(usuario_id=user.id)])
+    db.session.query(UserArtista).filter_by(usuario_id=user.id).delete()
+    marcar(usuarios=[user.id])
     db.session.delete(user)
     db.session.commit()
+    logout_user()
     flash('Sua conta foi excluída permanentemente.', 'success')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
 # -------------------- ADMIN --------------------
 def admin_required():
     if not current_user.is_authenticated or not current_user.is_admin:
         flash('Acesso negado. Você precisa ser um administrador.', 'danger')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
+
+def pagina_keyset(query, coluna, apos, limite):
+    if apos:
+        query = query.filter(coluna > apos)
+    itens = query.order_by(coluna).limit(limite + 1).all()
+    if len(itens) > limite:
+        return itens[:limite], itens[limite - 1].id
+    return itens, None
+
+def url_pagina(**params):
+    args = request.args.to_dict()
+    args.update(params)
+    return url_for(request.endpoint, **{k: v for k, v in args.items() if v})
 
-@app.route("/admin")
+@bp.route("/admin")
 @login_required
+@somente_leitura
 def admin_dashboard():
     admin_required() 
-    
-    generos = Genero.query.all()
-    artistas = Artista.query.all()
-    musicas = Musica.query.all()
-    return render_template("admin_dashboard.html", generos=generos, artistas=artistas, musicas=musicas)
+    limite = current_app.config['ADMIN_ITENS_POR_PAGINA']
+    snapshot = catalogo.atual(esperar=True)
+
+    generos, proximo_genero = snapshot.generos.pagina(
+        request.args.get('q_generos', '').strip(), request.args.get('apos_generos', type=int), limite)
+    artistas, proximo_artista = snapshot.artistas.pagina(
+        request.args.get('q_artistas', '').strip(), request.args.get('apos_artistas', type=int), limite)
 
-@app.route("/admin/generos", methods=["POST"])
+    q_musicas = request.args.get('q_musicas', '').strip()
+    consulta = Musica.query
+    if q_musicas:
+        consulta = consulta.filter(Musica.titulo.ilike(f'%{q_musicas}%'))
+    musicas, proxima_musica = pagina_keyset(
+        consulta, Musica.id, request.args.get('apos_musicas', type=int), limite)
+
+    return render_template(
+        "admin_dashboard.html",
+        generos=generos,
+        artistas=artistas,
+        musicas=musicas,
+        catalogo=snapshot,
+        todos_generos=snapshot.generos_por_nome,
+        proximo_genero=proximo_genero,
+        proximo_artista=proximo_artista,
+        proxima_musica=proxima_musica,
+        url_pagina=url_pagina,
+        cache=cache_recomendacoes.estatisticas()
+    )
+
+@bp.route("/admin/api/artistas")
+@login_required
+@somente_leitura
+def admin_api_artistas():
+    if not current_user.is_admin:
+        abort(403)
+    artistas = indice_artistas.buscar(request.args.get('q', ''), current_app.config['ARTISTAS_BUSCA_LIMITE'])
+    return jsonify([{"id": id, "nome": nome} for id, nome in artistas])
+
+@bp.route("/admin/generos", methods=["POST"])
 @login_required
 def admin_add_genero():
     admin_required()
     db.session.add(Genero(nome=request.form["nome"]))
     db.session.commit()
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route("/admin/generos/edit/<int:id>", methods=["GET", "POST"])
+@bp.route("/admin/generos/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def admin_edit_genero(id):
     admin_required()
@@ -202,45 +305,55 @@ def admin_edit_genero(id):
     if request.method == "POST":
         g.nome = request.form["nome"]
         db.session.commit()
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     return render_template("edit.html", tipo="Gênero", item=g)
 
-@app.route("/admin/generos/delete/<int:id>")
+@bp.route("/admin/generos/delete/<int:id>")
 @login_required
 def admin_del_genero(id):
     admin_required()
     db.session.delete(Genero.query.get(id))
     db.session.commit()
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
+
+def salvar_artista():
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('Já existe um artista com esse nome.', 'danger')
+        return False
+    return True
 
-@app.route("/admin/artistas", methods=["POST"])
+@bp.route("/admin/artistas", methods=["POST"])
 @login_required
 def admin_add_artista():
     admin_required()
     db.session.add(Artista(nome=request.form["nome"]))
-    db.session.commit()
-    return redirect(url_for('admin_dashboard'))
+    salvar_artista()
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route("/admin/artistas/edit/<int:id>", methods=["GET", "POST"])
+@bp.route("/admin/artistas/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def admin_edit_artista(id):
     admin_required()
     a = Artista.query.get(id)
     if request.method == "POST":
         a.nome = request.form["nome"]
-        db.session.commit()
-        return redirect(url_for('admin_dashboard'))
+        if not salvar_artista():
+            return redirect(url_for('main.admin_edit_artista', id=id))
+        return redirect(url_for('main.admin_dashboard'))
     return render_template("edit.html", tipo="Artista", item=a)
 
-@app.route("/admin/artistas/delete/<int:id>")
+@bp.route("/admin/artistas/delete/<int:id>")
 @login_required
 def admin_del_artista(id):
     admin_required()
     db.session.delete(Artista.query.get(id))
     db.session.commit()
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route("/admin/musicas", methods=["POST"])
+@bp.route("/admin/musicas", methods=["POST"])
 @login_required
 def admin_add_musica():
     admin_required()
@@ -255,16 +368,15 @@ def admin_add_musica():
     
     db.session.add(nova)
     db.session.commit()
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
 
-@app.route("/admin/musicas/edit/<int:id>", methods=["GET", "POST"])
+@bp.route("/admin/musicas/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 def admin_edit_musica(id):
     admin_required()
-    m = Musica.query.get(id)
-    generos = Genero.query.all()
-    artistas = Artista.query.all()
+    m = db.session.get(Musica, id)
+    snapshot = catalogo.atual(esperar=True)
 
     if request.method == "POST":
         m.titulo = request.form["titulo"]
@@ -276,22 +388,68 @@ def admin_edit_musica(id):
         m.generos.extend(generos_selecionados)
         
         db.session.commit()
-        return redirect(url_for('admin_dashboard'))
-    generos_selecionados_ids = [g.id for g in m.generos]
+        return redirect(url_for('main.admin_dashboard'))
+    generos_selecionados_ids = set(snapshot.generos_por_musica.get(m.id))
 
     return render_template(
         "edit_musica.html", 
         musica=m, 
-        generos=generos, 
-        artistas=artistas,
+        catalogo=snapshot,
+        generos=snapshot.generos_por_nome, 
         generos_selecionados_ids=generos_selecionados_ids
     )
 
 
-@app.route("/admin/musicas/delete/<int:id>")
+@bp.route("/admin/musicas/delete/<int:id>")
 @login_required
 def admin_del_musica(id):
     admin_required()
     db.session.delete(Musica.query.get(id))
     db.session.commit()
-    return redirect(url_for('admin_dashboard'))
\ No newline at end of file
+    return redirect(url_for('main.admin_dashboard'))
+
+
+@bp.route("/admin/metricas")
+@login_required
+def admin_metricas():
+    if not current_user.is_admin:
+        abort(403)
+    return current_app.response_class(metricas.texto_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/saude")
+def saude():
+    # Liveness: só diz que o processo responde, sem tocar no banco.
+    return jsonify(status="ok")
+
+@bp.route("/pronto")
+def pronto():
+    # Readiness: banco acessível e snapshot do catálogo carregado neste worker.
+    try:
+        db.session.execute(text("SELECT 1"))
+        versao = catalogo.atual().versao
+    except Exception:
+        current_app.logger.exception("Worker não está pronto")
+        return jsonify(status="indisponivel"), 503
+    return jsonify(status="pronto", catalogo=versao)
+
+@metricas.registrar_fonte
+def metricas_caches():
+    linhas = [
+        "# TYPE sync_cache_acertos_total counter",
+        "# TYPE sync_cache_falhas_total counter",
+    ]
+    for nome, cache in (("recomendacoes", cache_recomendacoes), ("usuarios", cache_usuarios)):
+        linhas.append(f'sync_cache_acertos_total{{cache="{nome}"}} {cache.acertos}')
+        linhas.append(f'sync_cache_falhas_total{{cache="{nome}"}} {cache.falhas}')
+    return linhas
+
+@metricas.registrar_fonte
+def metricas_processo():
+    linhas = []
+    rss, pss = memoria_processo()
+    for metrica, valor in (("sync_processo_rss_bytes", rss), ("sync_processo_pss_bytes", pss),
+                           ("sync_aquecimento_segundos", metricas.aquecimento)):
+        if valor is not None:
+            linhas.append(f"# TYPE {metrica} gauge")
+            linhas.append(f"{metrica} {valor}")
+    return linhas
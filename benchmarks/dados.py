@@ -0,0 +1,66 @@
+"""Gerador de catálogo e base de usuários sintéticos para os benchmarks."""
+import random
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import Artista, Genero, Musica, User, UserArtista, UserGenero, musica_genero
+
+SILABAS = ["ba", "lu", "ça", "ré", "mo", "ti", "na", "jo", "vã", "ke", "dé", "zu", "rô", "li", "sa", "pe"]
+GENEROS = [
+    "Rock", "Pop", "MPB", "Samba", "Funk", "Jazz", "Axé", "Forró", "Sertanejo", "Pagode",
+    "Reggae", "Blues", "Metal", "Indie", "Eletrônica", "Rap", "Bossa Nova", "Gospel", "Soul", "Clássica",
+]
+SENHA_PADRAO = "senha123"
+EMAIL_ADMIN = "admin@gmail.com"
+
+
+def _nome(aleatorio, i):
+    palavras = [
+        "".join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 3))).capitalize()
+        for _ in range(aleatorio.randint(1, 2))
+    ]
+    return f"{' '.join(palavras)} {i}"
+
+
+def _inserir(tabela, linhas, lote=10000):
+    for i in range(0, len(linhas), lote):
+        db.session.execute(insert(tabela), linhas[i:i + lote])
+
+
+def semear(musicas, artistas, usuarios, senha_hash, semente=42, generos_por_usuario=5,
+           artistas_por_usuario=5):
+    """Cria o esquema e preenche um banco vazio. Os ids são sequenciais a partir de 1."""
+    aleatorio = random.Random(semente)
+    db.create_all()
+
+    _inserir(Genero.__table__, [{"id": i + 1, "nome": nome} for i, nome in enumerate(GENEROS)])
+    _inserir(Artista.__table__, [{"id": i, "nome": _nome(aleatorio, i)} for i in range(1, artistas + 1)])
+    _inserir(Musica.__table__, [
+        {"id": i, "titulo": _nome(aleatorio, i), "artista_id": aleatorio.randint(1, artistas)}
+        for i in range(1, musicas + 1)
+    ])
+    _inserir(musica_genero, [
+        {"musica_id": i, "genero_id": g}
+        for i in range(1, musicas + 1)
+        for g in aleatorio.sample(range(1, len(GENEROS) + 1), aleatorio.randint(1, 3))
+    ])
+
+    _inserir(User.__table__, [{
+        "id": 1, "nome": "Admin", "email": EMAIL_ADMIN, "senha": senha_hash, "is_admin": True,
+    }] + [
+        {"id": i, "nome": f"Usuário {i}", "email": f"usuario{i}@exemplo.com",
+         "senha": senha_hash, "is_admin": False}
+        for i in range(2, usuarios + 1)
+    ])
+    _inserir(UserGenero.__table__, [
+        {"usuario_id": u, "genero_id": g}
+        for u in range(2, usuarios + 1)
+        for g in aleatorio.sample(range(1, len(GENEROS) + 1), generos_por_usuario)
+    ])
+    _inserir(UserArtista.__table__, [
+        {"usuario_id": u, "artista_id": a}
+        for u in range(2, usuarios + 1)
+        for a in aleatorio.sample(range(1, artistas + 1), min(artistas_por_usuario, artistas))
+    ])
+    db.session.commit()
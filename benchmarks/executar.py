@@ -0,0 +1,393 @@
+"""Benchmark dos endpoints principais contra um banco sintético.
+
+Uso (da raiz do projeto):
+
+    python -m benchmarks.executar --musicas 100000 --artistas 20000 --usuarios 50000
+    python -m benchmarks.executar --salvar-baseline      # grava benchmarks/baseline.json
+    python -m benchmarks.executar --modo http --concorrencia 16
+    python -m benchmarks.executar --overhead-metricas   # custo da instrumentação
+
+Com um baseline salvo, o processo sai com código 1 se o p95 de algum
+endpoint piorar além da tolerância ou se o número de consultas SQL por
+requisição aumentar. Com a escala (tamanho do banco, requisições e
+concorrência) diferente da do baseline, só as consultas SQL do modo
+cliente são comparadas: no modo http elas dependem de quantas requisições
+concorrentes acertam o cache.
+
+O benchmarks/baseline.json versionado foi gravado com os valores padrão
+(100000 músicas, 20000 artistas, 50000 usuários, 200 requisições por
+endpoint, 8 clientes HTTP). Latências dependem da máquina: regrave o
+baseline no ambiente onde a comparação vai rodar.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _argumentos():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--musicas", type=int, default=100000)
+    p.add_argument("--artistas", type=int, default=20000)
+    p.add_argument("--usuarios", type=int, default=50000)
+    p.add_argument("--banco", help="Arquivo SQLite do benchmark (reaproveitado se já existir).")
+    p.add_argument("--modo", choices=["cliente", "http", "ambos"], default="ambos")
+    p.add_argument("--requisicoes", type=int, default=200, help="Requisições por endpoint.")
+    p.add_argument("--concorrencia", type=int, default=8, help="Clientes simultâneos no modo http.")
+    p.add_argument("--baseline", default=BASELINE)
+    p.add_argument("--salvar-baseline", action="store_true")
+    p.add_argument("--tolerancia", type=float, default=0.25, help="Piora aceita no p95 (0.25 = 25%%).")
+    p.add_argument("--semente", type=int, default=42)
+    p.add_argument("--overhead-metricas", action="store_true",
+                   help="Compara o test client com e sem app.metricas, em vez do benchmark normal.")
+    p.add_argument("--overhead-max", type=float, default=0.05,
+                   help="Custo máximo aceito das métricas na soma dos p50 (0.05 = 5%%).")
+    return p.parse_args()
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def resumo(latencias, duracao, consultas=None):
+    r = {
+        "n": len(latencias),
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p95_ms": percentil(latencias, 95) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "req_s": len(latencias) / duracao if duracao else 0.0,
+    }
+    if consultas is not None:
+        r["sql"] = sum(consultas) / len(consultas) if consultas else 0.0
+    return r
+
+
+class Cenarios:
+    """Sorteia usuários, prefixos de busca e formulários para as requisições."""
+
+    def __init__(self, args, nomes_artistas):
+        self.args = args
+        self.aleatorio = random.Random(args.semente)
+        self.nomes_artistas = nomes_artistas
+
+    def usuario(self):
+        return self.aleatorio.randint(2, self.args.usuarios)
+
+    def prefixo(self):
+        nome = self.aleatorio.choice(self.nomes_artistas)
+        return nome[:self.aleatorio.randint(1, 4)]
+
+    def preferencias(self):
+        from benchmarks.dados import GENEROS
+        return {
+            "generos": [str(g) for g in self.aleatorio.sample(range(1, len(GENEROS) + 1), 4)],
+            "artistas": ", ".join(self.aleatorio.sample(self.nomes_artistas, 5)),
+        }
+
+    def login(self):
+        from benchmarks.dados import SENHA_PADRAO
+        return {"email": f"usuario{self.usuario()}@exemplo.com", "senha": SENHA_PADRAO}
+
+
+ENDPOINTS = ["home", "busca_artistas", "admin", "salvar_preferencias", "login"]
+# Endpoint do Flask de cada cenário, para ler as consultas SQL das métricas no modo http.
+ENDPOINTS_FLASK = {
+    "home": "main.home",
+    "busca_artistas": "main.api_search_artistas",
+    "admin": "main.admin_dashboard",
+    "salvar_preferencias": "main.perfil",
+    "login": "main.login",
+}
+
+
+def _requisicao(cliente, cenarios, nome, entrar):
+    """Executa uma requisição do cenário `nome`; `entrar(usuario_id)` autentica o cliente."""
+    if nome == "home":
+        entrar(cenarios.usuario())
+        return cliente.get("/")
+    if nome == "busca_artistas":
+        entrar(cenarios.usuario())
+        return cliente.get("/api/artistas/search", params={"q": cenarios.prefixo()})
+    if nome == "admin":
+        entrar(1)
+        return cliente.get("/admin")
+    if nome == "salvar_preferencias":
+        entrar(cenarios.usuario())
+        return cliente.post("/perfil", data=cenarios.preferencias())
+    if nome == "login":
+        entrar(None)
+        return cliente.post("/login", data=cenarios.login())
+    raise ValueError(nome)
+
+
+class ClienteTeste:
+    """Adapta o test client do Flask à interface (get/post com params/data) do requests."""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def entrar(self, usuario_id):
+        with self.cliente.session_transaction() as sessao:
+            sessao.clear()
+            if usuario_id is not None:
+                sessao["_user_id"] = str(usuario_id)
+                sessao["_fresh"] = True
+
+    def get(self, url, params=None):
+        return self.cliente.get(url, query_string=params)
+
+    def post(self, url, data=None):
+        return self.cliente.post(url, data=data)
+
+
+def medir_cliente(app, db, cenarios, requisicoes):
+    from sqlalchemy import event
+
+    consultas = [0]
+
+    def contar(*_):
+        consultas[0] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", contar)
+
+    cliente = ClienteTeste(app)
+    resultados = {}
+    try:
+        for nome in ENDPOINTS:
+            latencias, por_requisicao = [], []
+            inicio = time.perf_counter()
+            for _ in range(requisicoes):
+                consultas[0] = 0
+                t0 = time.perf_counter()
+                resposta = _requisicao(cliente, cenarios, nome, cliente.entrar)
+                latencias.append(time.perf_counter() - t0)
+                por_requisicao.append(consultas[0])
+                if resposta.status_code >= 400:
+                    raise RuntimeError(f"{nome}: HTTP {resposta.status_code}")
+            resultados[nome] = resumo(latencias, time.perf_counter() - inicio, por_requisicao)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", contar)
+    return resultados
+
+
+def medir_http(app, cenarios, requisicoes, concorrencia):
+    import requests
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from app.metricas import metricas
+
+    class SemLog(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server("127.0.0.1", 0, app, threaded=True, request_handler=SemLog)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_port}"
+
+    # O cookie de sessão é assinado aqui, como o login gravaria: trocar de usuário a cada
+    # requisição não paga o bcrypt, e a home não fica medindo só acertos do cache.
+    assinatura = app.session_interface.get_signing_serializer(app)
+    nome_cookie = app.config["SESSION_COOKIE_NAME"]
+
+    class ClienteHttp:
+        def __init__(self):
+            self.sessao = requests.Session()
+
+        def entrar(self, usuario_id):
+            self.sessao.cookies.clear()
+            if usuario_id is not None:
+                self.sessao.cookies.set(
+                    nome_cookie, assinatura.dumps({"_user_id": str(usuario_id), "_fresh": True}))
+
+        def get(self, url, params=None):
+            return self.sessao.get(base + url, params=params, allow_redirects=False)
+
+        def post(self, url, data=None):
+            return self.sessao.post(base + url, data=data, allow_redirects=False)
+
+    def trabalhador(nome, quantidade, intervalos):
+        cliente = ClienteHttp()
+        for _ in range(quantidade):
+            t0 = time.perf_counter()
+            resposta = _requisicao(cliente, cenarios, nome, cliente.entrar)
+            intervalos.append((t0, time.perf_counter()))
+            if resposta.status_code >= 400:
+                raise RuntimeError(f"{nome}: HTTP {resposta.status_code}")
+
+    resultados = {}
+    try:
+        for nome in ENDPOINTS:
+            intervalos = []
+            # Com requisições concorrentes, as consultas vêm dos contadores por endpoint das métricas.
+            antes = metricas.totais().get(ENDPOINTS_FLASK[nome], (0, 0))
+            por_cliente = max(1, requisicoes // concorrencia)
+            with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+                for futuro in [executor.submit(trabalhador, nome, por_cliente, intervalos)
+                               for _ in range(concorrencia)]:
+                    futuro.result()
+            # A vazão conta só o trecho medido, sem a criação do pool de threads.
+            duracao = max(fim for _, fim in intervalos) - min(inicio for inicio, _ in intervalos)
+            resultados[nome] = resumo([fim - inicio for inicio, fim in intervalos], duracao)
+            depois = metricas.totais().get(ENDPOINTS_FLASK[nome], (0, 0))
+            if metricas.ativas and depois[0] > antes[0]:
+                resultados[nome]["sql"] = (depois[1] - antes[1]) / (depois[0] - antes[0])
+    finally:
+        servidor.shutdown()
+    return resultados
+
+
+def medir_overhead(app, cenarios, requisicoes):
+    """Custo de app.metricas: cada requisição roda duas vezes, com e sem as métricas.
+
+    As duas execuções repetem o mesmo sorteio, com os caches desligados, e a
+    ordem alterna a cada requisição. Pareada assim, a comparação não sofre
+    com a variação de carga da máquina ao longo do benchmark.
+    """
+    from app.cache import cache_recomendacoes, cache_usuarios
+    from app.eventos import Alteracoes
+    from app.metricas import metricas
+
+    tudo = Alteracoes()
+    tudo.tudo = True
+    tamanhos = cache_recomendacoes.tamanho, cache_usuarios.tamanho
+    cache_recomendacoes.tamanho = cache_usuarios.tamanho = 0
+    cache_recomendacoes.invalidar(tudo)
+    cache_usuarios.invalidar(tudo)
+    cliente = ClienteTeste(app)
+    medianas = {False: {}, True: {}}
+    try:
+        for nome in ENDPOINTS:
+            tempos = {False: [], True: []}
+            for i in range(requisicoes):
+                estado = cenarios.aleatorio.getstate()
+                for ativas in ((False, True) if i % 2 == 0 else (True, False)):
+                    cenarios.aleatorio.setstate(estado)
+                    metricas.ativas = ativas
+                    t0 = time.perf_counter()
+                    _requisicao(cliente, cenarios, nome, cliente.entrar)
+                    tempos[ativas].append(time.perf_counter() - t0)
+            for ativas in tempos:
+                medianas[ativas][nome] = percentil(tempos[ativas], 50) * 1000
+    finally:
+        metricas.ativas = True
+        cache_recomendacoes.tamanho, cache_usuarios.tamanho = tamanhos
+
+    print("\n== overhead de app.metricas (p50, requisições pareadas, sem cache) ==")
+    print(f"{'endpoint':<22}{'sem ms':>10}{'com ms':>10}{'custo':>10}")
+    for nome in ENDPOINTS:
+        sem, com = medianas[False][nome], medianas[True][nome]
+        print(f"{nome:<22}{sem:>10.2f}{com:>10.2f}{(com - sem) / sem:>10.1%}")
+    sem, com = sum(medianas[False].values()), sum(medianas[True].values())
+    print(f"{'total':<22}{sem:>10.2f}{com:>10.2f}{(com - sem) / sem:>10.1%}")
+    return (com - sem) / sem
+
+
+def imprimir(modo, resultados):
+    print(f"\n== {modo} ==")
+    print(f"{'endpoint':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'sql':>8}")
+    for nome, r in resultados.items():
+        sql = f"{r['sql']:.1f}" if "sql" in r else "-"
+        print(f"{nome:<22}{r['n']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['req_s']:>10.1f}{sql:>8}")
+
+
+def escala(args):
+    return {chave: getattr(args, chave) for chave in ("musicas", "artistas", "usuarios", "requisicoes", "concorrencia")}
+
+
+def regressoes(resultados, baseline, tolerancia, mesma_escala=True):
+    falhas = []
+    for modo, endpoints in resultados.items():
+        if not mesma_escala and modo != "cliente":
+            continue
+        for nome, atual in endpoints.items():
+            ref = baseline.get(modo, {}).get(nome)
+            if not ref:
+                continue
+            if mesma_escala and atual["p95_ms"] > ref["p95_ms"] * (1 + tolerancia):
+                falhas.append(f"{modo}/{nome}: p95 {atual['p95_ms']:.2f}ms > baseline {ref['p95_ms']:.2f}ms")
+            if "sql" in ref and atual.get("sql", 0) > ref["sql"] + 0.5:
+                falhas.append(f"{modo}/{nome}: {atual['sql']:.1f} consultas > baseline {ref['sql']:.1f}")
+    return falhas
+
+
+def main():
+    args = _argumentos()
+    banco = args.banco or os.path.join(
+        tempfile.gettempdir(), f"bench_{args.musicas}_{args.artistas}_{args.usuarios}.db")
+    novo = not os.path.exists(banco)
+    from sqlalchemy import select
+
+    from app import create_app, db
+    from app.models import Artista
+    from app.senhas import senhas
+    from benchmarks.dados import SENHA_PADRAO, semear
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.abspath(banco)}",
+        "DATABASE_READ_URL": None,
+        "WTF_CSRF_ENABLED": False,
+    })
+
+    with app.app_context():
+        if novo:
+            print(f"Semeando {banco}...", flush=True)
+            t0 = time.perf_counter()
+            semear(args.musicas, args.artistas, args.usuarios, senhas.gerar_hash(SENHA_PADRAO), args.semente)
+            print(f"Banco pronto em {time.perf_counter() - t0:.1f}s", flush=True)
+        nomes = db.session.scalars(select(Artista.nome).limit(5000)).all()
+
+    cenarios = Cenarios(args, nomes)
+    if args.overhead_metricas:
+        custo = medir_overhead(app, cenarios, args.requisicoes)
+        if custo > args.overhead_max:
+            print(f"\nMétricas custam {custo:.1%} (> {args.overhead_max:.0%}).")
+            return 1
+        return 0
+
+    resultados = {}
+    if args.modo in ("cliente", "ambos"):
+        resultados["cliente"] = medir_cliente(app, db, cenarios, args.requisicoes)
+        imprimir("test client", resultados["cliente"])
+    if args.modo in ("http", "ambos"):
+        resultados["http"] = medir_http(app, cenarios, args.requisicoes, args.concorrencia)
+        imprimir(f"http, {args.concorrencia} clientes", resultados["http"])
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w") as arquivo:
+            json.dump({"escala": escala(args), **resultados}, arquivo, indent=2)
+            arquivo.write("\n")
+        print(f"\nBaseline salvo em {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as arquivo:
+            baseline = json.load(arquivo)
+        mesma_escala = baseline.get("escala") == escala(args)
+        if not mesma_escala:
+            print(f"\nEscala diferente da do baseline ({baseline.get('escala')}): "
+                  "comparando só as consultas SQL do modo cliente.")
+        falhas = regressoes(resultados, baseline, args.tolerancia, mesma_escala=mesma_escala)
+        if falhas:
+            print("\nRegressões:\n  " + "\n  ".join(falhas))
+            return 1
+        print("\nSem regressões em relação ao baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
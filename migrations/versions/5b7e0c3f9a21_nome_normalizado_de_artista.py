@@ -0,0 +1,59 @@
+"""nome normalizado de artista
+
+Revision ID: 5b7e0c3f9a21
+Revises: 091804b0d2f7
+Create Date: 2026-10-18 15:02:41.318204
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0c3f9a21'
+down_revision = '091804b0d2f7'
+branch_labels = None
+depends_on = None
+
+
+def _normalizar(texto):
+    # Cópia de app.texto.normalizar no momento da migração.
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold().strip()
+
+
+def upgrade():
+    op.drop_index('ix_artista_nome_lower', table_name='artista')
+    with op.batch_alter_table('artista', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nome_normalizado', sa.String(length=150), nullable=True))
+
+    # Quando dois artistas já cadastrados têm a mesma chave, só o de menor id
+    # fica com ela; os outros continuam existindo, mas não são mais achados pelo nome digitado.
+    conexao = op.get_bind()
+    artista = sa.table('artista', sa.column('id', sa.Integer), sa.column('nome', sa.String),
+                       sa.column('nome_normalizado', sa.String))
+    vistas = set()
+    valores = []
+    for id, nome in conexao.execute(sa.select(artista.c.id, artista.c.nome).order_by(artista.c.id)):
+        chave = _normalizar(nome)
+        if chave not in vistas:
+            vistas.add(chave)
+            valores.append({'b_id': id, 'b_chave': chave})
+    if valores:
+        conexao.execute(
+            artista.update().where(artista.c.id == sa.bindparam('b_id'))
+            .values(nome_normalizado=sa.bindparam('b_chave')),
+            valores,
+        )
+
+    with op.batch_alter_table('artista', schema=None) as batch_op:
+        batch_op.create_index('uq_artista_nome_normalizado', ['nome_normalizado'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('artista', schema=None) as batch_op:
+        batch_op.drop_index('uq_artista_nome_normalizado')
+        batch_op.drop_column('nome_normalizado')
+    op.create_index('ix_artista_nome_lower', 'artista', [sa.text('lower(nome)')], unique=False)
@@ -0,0 +1,23 @@
+/** Gera app/static/css/app.css: npm install && npm run build:css */
+module.exports = {
+  content: ['./app/templates/**/*.html', './app/static/js/**/*.js'],
+  theme: {
+    extend: {
+      fontFamily: {
+        sans: ['Inter', 'sans-serif'],
+      },
+      colors: {
+        neutral: {
+          900: '#121212',
+          800: '#181818',
+          700: '#282828',
+        },
+        purple: {
+          '500': '#A435F0',
+          '400': '#C084FC',
+        }
+      }
+    }
+  },
+  plugins: [],
+}